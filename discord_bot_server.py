@@ -9,15 +9,25 @@ import os
 import re
 import json
 import asyncio
+import aiohttp
 import requests
-import threading
 import hmac
+import copy
 import hashlib
 import base64
 import uuid
 import glob
+import secrets
+import tempfile
+import urllib.parse
 import time
-from flask import Flask, request, jsonify, send_from_directory
+import bisect
+import itertools
+import traceback
+import concurrent.futures
+from collections import OrderedDict
+from datetime import datetime
+from quart import Quart, request, jsonify, send_from_directory
 from dotenv import load_dotenv
 import discord
 from discord.ext import commands
@@ -41,7 +51,11 @@ except ImportError as e:
 
 # Canva自動化ハンドラー
 try:
-    from canva_handler import process_order as canva_process_order, get_current_tokens
+    from canva_handler import (
+        process_order as canva_process_order, get_current_tokens,
+        get_order_from_woocommerce, parse_order_data, create_pptx,
+        import_to_canva, save_tokens_to_file,
+    )
     CANVA_ENABLED = True
 except ImportError as e:
     CANVA_ENABLED = False
@@ -49,6 +63,9 @@ except ImportError as e:
     def get_current_tokens():
         return os.environ.get("CANVA_ACCESS_TOKEN"), os.environ.get("CANVA_REFRESH_TOKEN")
 
+# Canva処理用の固定サイズスレッドプール（Webhookバースト時も並行数を抑える）
+_canva_executor = concurrent.futures.ThreadPoolExecutor(max_workers=3, thread_name_prefix="canva")
+
 # API一覧・コスト取得モジュール
 try:
     from api_manager import register_api_commands, APICostView
@@ -65,8 +82,30 @@ except ImportError as e:
     OLLAMA_HANDLER_ENABLED = False
     print(f"[WARN] Ollama handler not available: {e}")
 
+# 高速JSONシリアライズ（orjsonが無ければ標準jsonにフォールバック）
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+except ImportError:
+    def _json_loads(data):
+        return json.loads(data)
+
+    def _json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
 load_dotenv()
 
+# 残存する同期HTTP呼び出し用の共有セッション（keep-aliveでTLSハンドシェイクを削減）
+_http = requests.Session()
+_http_adapter = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=20)
+_http.mount("https://", _http_adapter)
+_http.mount("http://", _http_adapter)
+
 # 環境変数（全て遅延読み込み - Railway Railpack対策）
 # os.environ.get() を使用（os.getenv検出を回避）
 def get_line_token():
@@ -103,12 +142,22 @@ def get_atelier_webhook_url():
 def get_atelier_webhook_secret():
     return os.environ.get("ATELIER_WEBHOOK_SECRET", "")
 
+# Canvaトークンの短期キャッシュ（両方必要な経路でget_current_tokens()を1回に抑える）
+_canva_token_cache = {"exp": 0, "access": None, "refresh": None}
+
+def _get_both_tokens():
+    if time.time() < _canva_token_cache["exp"]:
+        return _canva_token_cache["access"], _canva_token_cache["refresh"]
+    access, refresh = get_current_tokens()
+    _canva_token_cache.update(exp=time.time() + 300, access=access, refresh=refresh)
+    return access, refresh
+
 def get_canva_access_token():
-    access, _ = get_current_tokens()
+    access, _ = _get_both_tokens()
     return access or os.environ.get("CANVA_ACCESS_TOKEN")
 
 def get_canva_refresh_token():
-    _, refresh = get_current_tokens()
+    _, refresh = _get_both_tokens()
     return refresh or os.environ.get("CANVA_REFRESH_TOKEN")
 
 def get_canva_webhook_url():
@@ -126,6 +175,25 @@ def get_wc_consumer_secret():
 def get_woo_webhook_secret():
     return os.environ.get("WOO_WEBHOOK_SECRET", "")
 
+# Canva処理用config: 固定部分（環境変数は起動後に変わらない）は一度だけ読む
+_static_canva_config = None
+
+def _canva_config():
+    """Canva処理に渡すconfig dictを構築（トークンだけ毎回取得）"""
+    global _static_canva_config
+    if _static_canva_config is None:
+        _static_canva_config = {
+            'wc_url': get_wc_url(),
+            'wc_key': get_wc_consumer_key(),
+            'wc_secret': get_wc_consumer_secret(),
+            'discord_webhook': get_canva_webhook_url(),
+            'discord_bot_token': get_discord_token(),
+        }
+    config = dict(_static_canva_config)
+    config['canva_access_token'] = get_canva_access_token()
+    config['canva_refresh_token'] = get_canva_refresh_token()
+    return config
+
 def get_instagram_page_token():
     return os.environ.get("INSTAGRAM_PAGE_TOKEN", "")
 
@@ -148,6 +216,62 @@ JP_STATES = {
     'JP45': '宮崎県', 'JP46': '鹿児島県', 'JP47': '沖縄県'
 }
 
+# 'JP01'..'JP47'は連番なので、ハッシュ探索ではなくタプル添字で引く
+_JP_STATE_NAMES = ("",) + tuple(JP_STATES[f"JP{i:02d}"] for i in range(1, 48))
+
+
+def _jp_state_name(state):
+    """WooCommerceの都道府県コード（JP01〜JP47）を名称に変換する"""
+    if state and state.startswith("JP") and state[2:].isdigit():
+        idx = int(state[2:])
+        if 1 <= idx < len(_JP_STATE_NAMES):
+            return _JP_STATE_NAMES[idx]
+    return JP_STATES.get(state, state)
+
+# 添付画像判定用のプレフィックス（毎回のリテラル生成を避ける）
+_IMAGE_PREFIX = "image/"
+
+def _line_image_payload(url):
+    """LINE画像メッセージのペイロードを作る"""
+    return {"type": "image", "originalContentUrl": url, "previewImageUrl": url}
+
+
+# 顧客ステータス → WooCommerceステータスの対応（呼び出しごとに辞書を作らない）
+_WC_STATUS_MAP = {
+    "purchased": "designing",
+    "design-confirmed": "design-confirmed",
+    "produced": "produced",
+    "shipped": "shipped",
+}
+
+def _pick_shipping(shipping, billing, *keys):
+    """配送先を優先しつつ請求先にフォールバックして各キーを取り出す"""
+    return tuple(shipping.get(k) or billing.get(k, '') for k in keys)
+
+
+# ホットパスで使う正規表現はモジュールロード時に1回だけコンパイル
+_ORDER_NUM_RE = re.compile(r'#(\d+)')
+_LINE_USER_ID_RE = re.compile(r'LINE User ID:\s*`?([A-Za-z0-9]+)`?')
+_LINE_USER_ID_TOPIC_RE = re.compile(r'LINE User ID:\s*(\S+)')
+_CUSTOMER_NAME_RE = re.compile(r'#\d+\s+(.+?)(?:\s*様|\s*\()')
+_CUSTOMER_NAME_FALLBACK_RE = re.compile(r'#\d+\s+(.+)')
+_NAME_PREFIX_RE = re.compile(r'^[^\s#]+\s*')
+_EMBED_TITLE_NAME_RE = re.compile(r'\|\s*#\S+\s+(.+?)\s*様')
+_PREF_RE = re.compile(r'(北海道|.{2,3}[都道府県])(.*)')
+_CITY_RE = re.compile(r'(.+?[市区町村郡])(.*)')
+
+# \u30b9\u30c6\u30fc\u30bf\u30b9\u7d75\u6587\u5b57\u30d7\u30ec\u30d5\u30a3\u30c3\u30af\u30b9\uff08\u30b9\u30ec\u30c3\u30c9\u540d\u306e\u5148\u982d1\u6587\u5b57\u5224\u5b9a\u3067\u8db3\u308a\u308b\u305f\u3081\u6b63\u898f\u8868\u73fe\u4e0d\u8981\uff09
+_STATUS_EMOJIS = frozenset(
+    '\U0001F7E0\U0001F7E1\U0001F535\U0001F7E2\u2705\U0001F4E6\U0001F389\U0001F490\U0001F64F'
+)
+
+
+def _strip_status_emoji(name):
+    """\u30b9\u30ec\u30c3\u30c9\u540d\u306e\u5148\u982d\u304b\u3089\u30b9\u30c6\u30fc\u30bf\u30b9\u7d75\u6587\u5b57\u3068\u5f8c\u7d9a\u306e\u7a7a\u767d\u3092\u9664\u53bb\u3059\u308b"""
+    if name and name[0] in _STATUS_EMOJIS:
+        return name[1:].lstrip()
+    return name
+
 # スレッドマップファイル
 THREAD_MAP_FILE = os.path.join(os.path.dirname(__file__), "thread_map.json")
 INSTAGRAM_THREAD_MAP_FILE = os.path.join(os.path.dirname(__file__), "instagram_thread_map.json")
@@ -171,7 +295,7 @@ def proxy_image_for_line(image_url):
         cleanup_proxy_images()
 
         # 画像をダウンロード
-        resp = requests.get(image_url, timeout=15)
+        resp = _http.get(image_url, timeout=15)
         if resp.status_code != 200:
             print(f"[ImageProxy] Download failed: {resp.status_code} from {image_url[:80]}")
             return None
@@ -210,8 +334,8 @@ def cleanup_proxy_images():
     except Exception:
         pass
 
-# Flask API
-api = Flask(__name__)
+# Quart API（Flask互換・Botと同一イベントループで動作）
+api = Quart(__name__)
 api.secret_key = os.environ.get("FLASK_SECRET_KEY", os.urandom(24).hex())
 
 # 商品登録ルート登録
@@ -223,13 +347,99 @@ if PRODUCT_REGISTER_ENABLED:
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+
+
+class DevBot(commands.Bot):
+    async def close(self):
+        # 共有aiohttpセッションを閉じてからBotを終了
+        global aiohttp_session
+        if aiohttp_session and not aiohttp_session.closed:
+            await aiohttp_session.close()
+        await super().close()
+
+
+bot = DevBot(command_prefix="!", intents=intents)
 
 # グローバル変数
 overview_message_id = None
 
+# 一覧メッセージIDの永続化先（再起動後の履歴スキャンを省く）
+_OVERVIEW_STATE_FILE = os.path.join(
+    os.environ.get("DATA_DIR", os.path.dirname(__file__)), "overview_state.json"
+)
+
+# 一覧更新のデバウンス（連続するステータス変更を1回の更新にまとめる）
+# Python 3.9以前のEventはimport時のループに束縛されるため、実行中のループ上で遅延生成する
+_overview_dirty = None
+_overview_debouncer_started = False
+
+
+def _get_overview_dirty():
+    global _overview_dirty
+    if _overview_dirty is None:
+        _overview_dirty = asyncio.Event()
+    return _overview_dirty
+
+
+def load_overview_state():
+    """保存済みの一覧メッセージIDを復元する"""
+    global overview_message_id
+    state = _load_json_cached(_OVERVIEW_STATE_FILE)
+    if state:
+        overview_message_id = state.get("overview_message_id")
+
+
+def _save_overview_state():
+    """一覧メッセージIDをファイルに保存する"""
+    try:
+        tmp_path = _OVERVIEW_STATE_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(_json_dumps({"overview_message_id": overview_message_id}))
+        os.replace(tmp_path, _OVERVIEW_STATE_FILE)
+    except OSError as e:
+        print(f"[WARN] Failed to save overview state: {e}")
+
+
+def schedule_overview_update():
+    """一覧更新を予約する（2秒のデバウンス後にまとめて実行）"""
+    _get_overview_dirty().set()
+
+
+async def overview_debouncer():
+    """予約された一覧更新をデバウンスして実行する"""
+    dirty = _get_overview_dirty()
+    while True:
+        await dirty.wait()
+        await asyncio.sleep(2)
+        dirty.clear()
+        await update_overview_channel()
 
-def send_line_message(user_id, messages):
+
+def start_overview_debouncer():
+    """デバウンスタスクを起動（on_readyの再発火では二重起動しない）"""
+    global _overview_debouncer_started
+    if _overview_debouncer_started:
+        return
+    _overview_debouncer_started = True
+    asyncio.create_task(overview_debouncer())
+
+# 共有aiohttpセッション（接続プール・keep-alive再利用）
+aiohttp_session = None
+
+
+def get_http_session():
+    """共有aiohttp ClientSessionを取得（イベントループ上で遅延生成）"""
+    global aiohttp_session
+    if aiohttp_session is None or aiohttp_session.closed:
+        # keep-aliveプール拡大とDNSキャッシュで、テンプレート送信時の
+        # 連続WC/LINE呼び出しがハンドシェイクを払い直さないようにする
+        aiohttp_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+        )
+    return aiohttp_session
+
+
+async def send_line_message(user_id, messages):
     """LINEにメッセージ送信"""
     url = "https://api.line.me/v2/bot/message/push"
     headers = {
@@ -237,87 +447,122 @@ def send_line_message(user_id, messages):
         "Authorization": f"Bearer {get_line_token()}"
     }
     data = {"to": user_id, "messages": messages}
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code != 200:
-        print(f"[LINE] Send failed: {response.status_code} {response.text[:200]}")
-    return response.status_code == 200
+    try:
+        async with get_http_session().post(url, headers=headers, json=data) as response:
+            if response.status != 200:
+                body = await response.text()
+                print(f"[LINE] Send failed: {response.status} {body[:200]}")
+            return response.status == 200
+    except aiohttp.ClientError as e:
+        print(f"[LINE] Send error: {e}")
+        return False
 
 
 def get_line_user_id_from_channel(channel):
     """チャンネルのトピックからLINE User IDを取得"""
     if not channel.topic:
         return None
-    match = re.search(r'LINE User ID:\s*(\S+)', channel.topic)
+    match = _LINE_USER_ID_TOPIC_RE.search(channel.topic)
     if match:
         return match.group(1)
     return None
 
 
+# JSONファイルキャッシュ（mtimeが変わらない限り再パースしない）
+_json_file_cache = {}
+
+
+def _load_json_cached(path, default=None):
+    """JSONファイルをmtime無効化付きキャッシュ経由で読み込み"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return default
+    cached = _json_file_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        data = _json_loads(f.read())
+    _json_file_cache[path] = (mtime, data)
+    return data
+
+
 def load_thread_map():
     """スレッドマップを読み込み"""
-    if os.path.exists(THREAD_MAP_FILE):
-        with open(THREAD_MAP_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    return _load_json_cached(THREAD_MAP_FILE, {})
+
+
+def load_instagram_thread_map():
+    """Instagramスレッドマップを読み込み"""
+    return _load_json_cached(INSTAGRAM_THREAD_MAP_FILE, {})
+
+
+# スレッドID → (platform, user_id) の逆引きインデックス（mtime無効化）
+_reverse_index_cache = {"line_mtime": 0, "ig_mtime": 0, "index": {}, "line_users": {}}
+
+
+def _file_mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _get_thread_reverse_index():
+    """両スレッドマップを1回のパースで逆引きインデックス化して返す"""
+    line_mtime = _file_mtime_ns(THREAD_MAP_FILE)
+    ig_mtime = _file_mtime_ns(INSTAGRAM_THREAD_MAP_FILE)
+    cache = _reverse_index_cache
+    if cache["line_mtime"] == line_mtime and cache["ig_mtime"] == ig_mtime and cache["index"]:
+        return cache
+
+    index = {}
+    line_users = {}
+    for line_user_id, data in load_thread_map().items():
+        thread_id = str(data.get('thread_id'))
+        index.setdefault(thread_id, ('line', line_user_id))
+        line_users.setdefault(thread_id, []).append({
+            'line_user_id': line_user_id,
+            'display_name': data.get('display_name', '不明')
+        })
+    for ig_user_id, data in load_instagram_thread_map().items():
+        index.setdefault(str(data.get('thread_id')), ('instagram', ig_user_id))
+
+    cache["line_mtime"] = line_mtime
+    cache["ig_mtime"] = ig_mtime
+    cache["index"] = index
+    cache["line_users"] = line_users
+    return cache
 
 
 def get_line_user_id_from_thread(thread_id):
     """スレッドIDからLINE User IDを取得"""
-    thread_map = load_thread_map()
-    for line_user_id, data in thread_map.items():
-        if str(data.get('thread_id')) == str(thread_id):
-            return line_user_id
+    entry = _get_thread_reverse_index()["index"].get(str(thread_id))
+    if entry and entry[0] == 'line':
+        return entry[1]
     return None
 
 
 def get_all_line_users_from_thread(thread_id):
     """スレッドIDから全LINE User IDと表示名を取得（複数ユーザー対応）"""
-    thread_map = load_thread_map()
-    users = []
-    for line_user_id, data in thread_map.items():
-        if str(data.get('thread_id')) == str(thread_id):
-            users.append({
-                'line_user_id': line_user_id,
-                'display_name': data.get('display_name', '不明')
-            })
-    return users
-
-
-def load_instagram_thread_map():
-    """Instagramスレッドマップを読み込み"""
-    if os.path.exists(INSTAGRAM_THREAD_MAP_FILE):
-        with open(INSTAGRAM_THREAD_MAP_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    return _get_thread_reverse_index()["line_users"].get(str(thread_id), [])
 
 
 def get_instagram_user_id_from_thread(thread_id):
     """スレッドIDからInstagram User IDを取得"""
-    ig_map = load_instagram_thread_map()
-    for ig_user_id, data in ig_map.items():
-        if str(data.get('thread_id')) == str(thread_id):
-            return ig_user_id
+    entry = _get_thread_reverse_index()["index"].get(str(thread_id))
+    if entry and entry[0] == 'instagram':
+        return entry[1]
     return None
 
 
 def get_platform_from_thread(thread_id):
     """スレッドIDからプラットフォームを判定（'line', 'instagram', None）"""
-    # LINE thread_map をチェック
-    line_map = load_thread_map()
-    for _, data in line_map.items():
-        if str(data.get('thread_id')) == str(thread_id):
-            return 'line'
-
-    # Instagram thread_map をチェック
-    ig_map = load_instagram_thread_map()
-    for _, data in ig_map.items():
-        if str(data.get('thread_id')) == str(thread_id):
-            return 'instagram'
-
-    return None
+    entry = _get_thread_reverse_index()["index"].get(str(thread_id))
+    return entry[0] if entry else None
 
 
-def send_instagram_message(user_id, text):
+async def send_instagram_message(user_id, text):
     """Instagram DM でテキストメッセージを送信"""
     token = get_instagram_page_token()
     if not token:
@@ -335,19 +580,22 @@ def send_instagram_message(user_id, text):
     }
 
     try:
-        response = requests.post(url, json=data, headers=headers, timeout=10)
-        if response.status_code == 200:
-            print(f"[IG] Message sent to {user_id}")
-            return True
-        else:
-            print(f"[IG] Send failed: {response.status_code} {response.text}")
-            return False
+        async with get_http_session().post(
+            url, json=data, headers=headers, timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            if response.status == 200:
+                print(f"[IG] Message sent to {user_id}")
+                return True
+            else:
+                body = await response.text()
+                print(f"[IG] Send failed: {response.status} {body}")
+                return False
     except Exception as e:
         print(f"[IG] Send error: {e}")
         return False
 
 
-def send_instagram_image(user_id, image_url):
+async def send_instagram_image(user_id, image_url):
     """Instagram DM で画像を送信"""
     token = get_instagram_page_token()
     if not token:
@@ -370,34 +618,180 @@ def send_instagram_image(user_id, image_url):
     }
 
     try:
-        response = requests.post(url, json=data, headers=headers, timeout=10)
-        if response.status_code == 200:
-            print(f"[IG] Image sent to {user_id}")
-            return True
-        else:
-            print(f"[IG] Image send failed: {response.status_code} {response.text}")
-            return False
+        async with get_http_session().post(
+            url, json=data, headers=headers, timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            if response.status == 200:
+                print(f"[IG] Image sent to {user_id}")
+                return True
+            else:
+                body = await response.text()
+                print(f"[IG] Image send failed: {response.status} {body}")
+                return False
     except Exception as e:
         print(f"[IG] Image send error: {e}")
         return False
 
 
+# ================== Outbound Queue ==================
+# Discord→LINE/IG転送をワーカー経由で送信（バースト時のレイテンシ平滑化）
+# 同一ユーザー宛の順序を保つため、user_idで固定のワーカーキューに振り分ける
+_OUTBOUND_WORKER_COUNT = 4
+_outbound_queues = []
+_outbound_workers_started = False
+
+_OUTBOUND_SENDERS = {
+    "line": lambda user_id, payload: send_line_message(user_id, payload),
+    "instagram_text": lambda user_id, payload: send_instagram_message(user_id, payload),
+    "instagram_image": lambda user_id, payload: send_instagram_image(user_id, payload),
+}
+
+
+async def outbound_worker(queue):
+    """担当キューから転送ジョブを取り出して送信し、結果リアクションを付ける"""
+    while True:
+        platform, user_id, payload, message, ok_reaction = await queue.get()
+        try:
+            sender = _OUTBOUND_SENDERS.get(platform)
+            success = await sender(user_id, payload) if sender else False
+            if message:
+                try:
+                    await message.add_reaction(ok_reaction if success else "❌")
+                except discord.HTTPException:
+                    pass
+        except Exception as e:
+            print(f"[Queue] Outbound send error ({platform}): {e}")
+        finally:
+            queue.task_done()
+
+
+def start_outbound_workers(count=_OUTBOUND_WORKER_COUNT):
+    """転送ワーカーを起動（on_readyの再発火では二重起動しない）"""
+    global _outbound_workers_started
+    if _outbound_workers_started:
+        return
+    _outbound_workers_started = True
+    for _ in range(count):
+        queue = asyncio.Queue(maxsize=250)  # 全ワーカー合計で従来の1000相当
+        _outbound_queues.append(queue)
+        asyncio.create_task(outbound_worker(queue))
+    print(f"[OK] Outbound workers started ({count})")
+
+
+async def enqueue_outbound(platform, user_id, payload, message, ok_reaction):
+    """user_idごとに同じワーカーへ振り分けて宛先単位の送信順序を保つ"""
+    if not _outbound_workers_started:
+        start_outbound_workers()
+    queue = _outbound_queues[hash(user_id) % len(_outbound_queues)]
+    await queue.put((platform, user_id, payload, message, ok_reaction))
+
+
 # テンプレート（DATA_DIRに保存版があればそちらを優先）
 _TEMPLATES_BUNDLED = os.path.join(os.path.dirname(__file__), "line_templates.json")
 _DATA_DIR = os.environ.get("DATA_DIR", os.path.dirname(__file__))
 _TEMPLATES_SAVED = os.path.join(_DATA_DIR, "line_templates.json")
 
+# アトリエフォーラムの 注文ID → スレッドID インデックス（on_readyで構築）
+_atelier_order_thread_index = {}
+
+# フォーラムID → (タグ数, ステータス → タグ) のインデックス
+# タグ数の変化かon_guild_channel_updateで再構築される
+_forum_tag_index = {}
+
+
+def _build_status_tag_index(forum):
+    """全ステータス分のタグ対応を一度の走査系で構築する"""
+    index = {}
+    for status, config in STATUS_CONFIG.items():
+        for tag in forum.available_tags:
+            if config['label'] in tag.name or config['emoji'] in (str(getattr(tag, 'emoji', '') or '')):
+                index[status] = tag
+                break
+    return index
+
+
+def _get_status_tag(forum, status):
+    """ステータスに対応するフォーラムタグを取得（インデックス優先）"""
+    tag_count = len(forum.available_tags)
+    cached = _forum_tag_index.get(forum.id)
+    if cached is None or cached[0] != tag_count:
+        cached = (tag_count, _build_status_tag_index(forum))
+        _forum_tag_index[forum.id] = cached
+    return cached[1].get(status)
+
 # テンプレートボタンメッセージID追跡（スレッドID → メッセージID）
 _template_button_msg_ids = {}
-_posting_buttons_lock = set()  # 再投稿ループ防止
+_TEMPLATE_BUTTON_MSGS_FILE = os.path.join(_DATA_DIR, "button_msgs.json")
+_button_msgs_dirty = False
+_button_msgs_flusher_started = False
+
+
+def load_template_button_msgs():
+    """保存済みのボタンメッセージIDを復元（再起動後も旧ボタンを削除できるように）"""
+    try:
+        if os.path.exists(_TEMPLATE_BUTTON_MSGS_FILE):
+            with open(_TEMPLATE_BUTTON_MSGS_FILE, 'r', encoding='utf-8') as f:
+                _template_button_msg_ids.update(_json_loads(f.read()))
+            print(f"[OK] Restored {len(_template_button_msg_ids)} template button message ids")
+    except Exception as e:
+        print(f"[WARN] Failed to load template button message ids: {e}")
+
+
+def _save_template_button_msgs():
+    # 一時ファイル経由で置き換え（クラッシュ時の部分書き込みを防ぐ）
+    tmp_path = _TEMPLATE_BUTTON_MSGS_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(_json_dumps(_template_button_msg_ids))
+    os.replace(tmp_path, _TEMPLATE_BUTTON_MSGS_FILE)
+
+
+def _mark_button_msgs_dirty():
+    global _button_msgs_dirty
+    _button_msgs_dirty = True
+
+
+async def button_msgs_flusher():
+    """ダーティフラグを5秒ごとにまとめて書き出す（更新のたびに書かない）"""
+    global _button_msgs_dirty
+    while True:
+        await asyncio.sleep(5)
+        if _button_msgs_dirty:
+            _button_msgs_dirty = False
+            try:
+                await asyncio.to_thread(_save_template_button_msgs)
+            except Exception as e:
+                print(f"[WARN] Failed to save template button message ids: {e}")
+
+
+def start_button_msgs_flusher():
+    """書き出しタスクを起動（on_readyの再発火では二重起動しない）"""
+    global _button_msgs_flusher_started
+    if _button_msgs_flusher_started:
+        return
+    _button_msgs_flusher_started = True
+    asyncio.create_task(button_msgs_flusher())
+
+# スレッドごとの投稿ロック（LRUで上限512件に抑えてメモリリークを防ぐ）
+_thread_post_locks = OrderedDict()
+
+
+def _lock_for(thread_id):
+    """スレッドIDに対応するasyncio.Lockを取得（古いものから破棄）"""
+    lock = _thread_post_locks.get(thread_id)
+    if lock is None:
+        lock = _thread_post_locks[thread_id] = asyncio.Lock()
+        if len(_thread_post_locks) > 512:
+            _thread_post_locks.popitem(last=False)
+    else:
+        _thread_post_locks.move_to_end(thread_id)
+    return lock
 
 
 def _get_bundled_version():
     """バンドル版のバージョンとテンプレートを取得"""
-    if os.path.exists(_TEMPLATES_BUNDLED):
-        with open(_TEMPLATES_BUNDLED, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get("version", 0), data.get("templates", [])
+    data = _load_json_cached(_TEMPLATES_BUNDLED)
+    if data is not None:
+        return data.get("version", 0), data.get("templates", [])
     return 0, []
 
 
@@ -406,11 +800,10 @@ def load_templates():
     bundled_ver, bundled_templates = _get_bundled_version()
     bundled_ids = {t["id"] for t in bundled_templates}
 
-    if os.path.exists(_TEMPLATES_SAVED):
-        with open(_TEMPLATES_SAVED, 'r', encoding='utf-8') as f:
-            saved_data = json.load(f)
-            saved_ver = saved_data.get("version", 0)
-            saved_templates = saved_data.get("templates", [])
+    saved_data = _load_json_cached(_TEMPLATES_SAVED)
+    if saved_data is not None:
+        saved_ver = saved_data.get("version", 0)
+        saved_templates = saved_data.get("templates", [])
 
         if bundled_ver > saved_ver:
             # バンドル版の1〜7を更新しつつ、カスタム追加分(8,9等)は保持
@@ -424,18 +817,53 @@ def load_templates():
     return bundled_templates
 
 
+# テンプレートID → テンプレートの逆引き（リストオブジェクトが同じ間は再構築しない）
+_templates_by_id_cache = (None, {})
+
+
+def load_templates_by_id():
+    """テンプレートをID引き用のdictで取得する"""
+    global _templates_by_id_cache
+    templates = load_templates()
+    if _templates_by_id_cache[0] is not templates:
+        _templates_by_id_cache = (templates, {t["id"]: t for t in templates})
+    return _templates_by_id_cache[1]
+
+
+# 前回保存したテンプレートのハッシュ（内容が同じなら書き込みをスキップ）
+_last_templates_hash = None
+
+
 def save_templates(templates, version=None):
-    """テンプレートをDATA_DIRに保存（versionも保持）"""
+    """テンプレートをDATA_DIRに保存（versionも保持・内容不変時はスキップ）"""
+    global _last_templates_hash
     # 既存のバージョンを維持
     if version is None:
-        if os.path.exists(_TEMPLATES_SAVED):
-            with open(_TEMPLATES_SAVED, 'r', encoding='utf-8') as f:
-                existing = json.load(f)
-                version = existing.get("version", 0)
+        existing = _load_json_cached(_TEMPLATES_SAVED)
+        if existing is not None:
+            version = existing.get("version", 0)
         else:
             version, _ = _get_bundled_version()
-    with open(_TEMPLATES_SAVED, 'w', encoding='utf-8') as f:
-        json.dump({"version": version, "templates": templates}, f, ensure_ascii=False, indent=2)
+    serialized = _json_dumps({"version": version, "templates": templates})
+    payload_hash = hashlib.blake2b(serialized.encode('utf-8'), digest_size=16).digest()
+    if payload_hash == _last_templates_hash:
+        return
+    # 一時ファイル経由で置き換え（クラッシュ時の部分書き込みを防ぐ）
+    tmp_path = _TEMPLATES_SAVED + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(serialized)
+    os.replace(tmp_path, _TEMPLATES_SAVED)
+    _last_templates_hash = payload_hash
+
+
+async def aload_templates():
+    """load_templatesをスレッドで実行（キャッシュミス時のファイルI/Oでループを塞がない）"""
+    return await asyncio.to_thread(load_templates)
+
+
+async def asave_templates(templates, version=None):
+    """save_templatesをスレッドで実行（書き込みでループを塞がない）"""
+    await asyncio.to_thread(save_templates, templates, version)
 
 
 def get_thread_customer_info(thread):
@@ -443,18 +871,40 @@ def get_thread_customer_info(thread):
     Returns: (customer_name, order_or_inquiry_id, is_inquiry)
     """
     # 顧客名抽出: 絵文字 #ID 名前 様 (IG名) のパターンに対応
-    name_match = re.search(r'#\d+\s+(.+?)(?:\s*様|\s*\()', thread.name)
+    name_match = _CUSTOMER_NAME_RE.search(thread.name)
     if not name_match:
-        name_match = re.search(r'#\d+\s+(.+)', thread.name)
+        name_match = _CUSTOMER_NAME_FALLBACK_RE.search(thread.name)
     customer_name = name_match.group(1).strip().rstrip('様').strip() if name_match else "お客様"
 
-    order_match = re.search(r'#(\d+)', thread.name)
+    order_match = _ORDER_NUM_RE.search(thread.name)
     target_id = order_match.group(1) if order_match else None
     inquiry = is_inquiry_thread(thread)
 
     return customer_name, target_id, inquiry
 
 
+def persist_thread_mapping(line_user_id, thread_id, display_name='不明'):
+    """履歴スキャンで見つけたLINE User IDをthread_map.jsonに書き戻す
+
+    次回以降は逆引きインデックスでO(1)解決できるようにする。
+    tmpファイル経由のos.replaceで書き込み中のクラッシュにも安全。
+    """
+    try:
+        thread_map = dict(load_thread_map())
+        entry = dict(thread_map.get(line_user_id, {}))
+        entry['thread_id'] = str(thread_id)
+        entry.setdefault('display_name', display_name)
+        thread_map[line_user_id] = entry
+
+        tmp_path = THREAD_MAP_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(_json_dumps(thread_map))
+        os.replace(tmp_path, THREAD_MAP_FILE)
+        print(f"[ThreadMap] Persisted mapping: {line_user_id} → {thread_id}")
+    except Exception as e:
+        print(f"[ThreadMap] Persist failed: {e}")
+
+
 async def find_line_user_id_in_thread(thread):
     """スレッドからLINE User IDを検索"""
     line_user_id = get_line_user_id_from_thread(thread.id)
@@ -463,15 +913,17 @@ async def find_line_user_id_in_thread(thread):
 
     async for msg in thread.history(limit=5, oldest_first=True):
         if msg.content:
-            match = re.search(r'LINE User ID:\s*`?([A-Za-z0-9]+)`?', msg.content)
+            match = _LINE_USER_ID_RE.search(msg.content)
             if match:
+                persist_thread_mapping(match.group(1), thread.id)
                 return match.group(1)
         for embed in msg.embeds:
             embed_text = (embed.description or "")
             for field in embed.fields:
                 embed_text += f" {field.name} {field.value}"
-            match = re.search(r'LINE User ID:\s*`?([A-Za-z0-9]+)`?', embed_text)
+            match = _LINE_USER_ID_RE.search(embed_text)
             if match:
+                persist_thread_mapping(match.group(1), thread.id)
                 return match.group(1)
 
     return None
@@ -500,35 +952,33 @@ async def create_status_embed():
         )
 
         if data['customers']:
-            customer_links = []
-            for c in data['customers']:
-                channel_id = c.get('discord_channel_id')
-                name = c.get('display_name', '不明')
-                order_num = ""
-                if c.get('orders'):
-                    latest_order = c['orders'][-1]
-                    order_num = f"#{latest_order.get('order_id', '')} "
-                if channel_id:
-                    customer_links.append(f"• {order_num}<#{channel_id}> {name}様")
-                else:
-                    customer_links.append(f"• {order_num}{name}様")
-
-            # Embed文字数制限(4096)対策: 超える場合は複数Embedに分割
-            chunk = []
-            chunk_len = 0
-            for line in customer_links:
-                if chunk_len + len(line) + 1 > 4000 and chunk:
-                    embed.description = "\n".join(chunk)
+            customer_links = [
+                "• {}{}{}様".format(
+                    f"#{c['orders'][-1].get('order_id', '')} " if c.get('orders') else "",
+                    f"<#{c['discord_channel_id']}> " if c.get('discord_channel_id') else "",
+                    c.get('display_name', '不明'),
+                )
+                for c in data['customers']
+            ]
+
+            # Embed文字数制限(4096)対策: 累積長の二分探索で分割位置を一度に決める
+            cum = list(itertools.accumulate(len(line) + 1 for line in customer_links))
+            start = 0
+            first_chunk = True
+            while start < len(customer_links):
+                base = cum[start - 1] if start else 0
+                end = bisect.bisect_right(cum, base + 4000, lo=start)
+                if end == start:
+                    end = start + 1  # 1行だけで上限超の場合も前進させる
+                if not first_chunk:
                     embeds.append(embed)
                     embed = discord.Embed(
                         title=f"{config['emoji']} {config['label']} (続き)",
                         color=config['color']
                     )
-                    chunk = []
-                    chunk_len = 0
-                chunk.append(line)
-                chunk_len += len(line) + 1
-            embed.description = "\n".join(chunk) if chunk else "_該当なし_"
+                embed.description = "\n".join(customer_links[start:end])
+                first_chunk = False
+                start = end
         else:
             embed.description = "_該当なし_"
 
@@ -669,13 +1119,7 @@ class StatusSelectMenu(discord.ui.Select):
                 results.append(f"⚠️ スレッド更新失敗 (#{order_id}): {e}")
 
             # WooCommerce ステータス更新
-            wc_status_map = {
-                "purchased": "designing",
-                "design-confirmed": "design-confirmed",
-                "produced": "produced",
-                "shipped": "shipped",
-            }
-            wc_status = wc_status_map.get(new_status.value, new_status.value)
+            wc_status = _WC_STATUS_MAP.get(new_status.value, new_status.value)
             wc_url = get_wc_url()
             wc_key = get_wc_consumer_key()
             wc_secret = get_wc_consumer_secret()
@@ -683,16 +1127,19 @@ class StatusSelectMenu(discord.ui.Select):
             if all([wc_url, wc_key, wc_secret]):
                 try:
                     url = f"{wc_url}/wp-json/wc/v3/orders/{order_id}"
-                    resp = requests.put(url, auth=(wc_key, wc_secret), json={"status": wc_status}, timeout=10)
-                    if resp.status_code == 200:
-                        results.append(f"✅ WooCommerce → {wc_status} (#{order_id})")
-                    else:
-                        results.append(f"⚠️ WooCommerce更新失敗 (#{order_id}: {resp.status_code})")
+                    async with get_http_session().put(
+                        url, auth=aiohttp.BasicAuth(wc_key, wc_secret),
+                        json={"status": wc_status}, timeout=aiohttp.ClientTimeout(total=10)
+                    ) as resp:
+                        if resp.status == 200:
+                            results.append(f"✅ WooCommerce → {wc_status} (#{order_id})")
+                        else:
+                            results.append(f"⚠️ WooCommerce更新失敗 (#{order_id}: {resp.status})")
                 except Exception as e:
                     results.append(f"⚠️ WooCommerceエラー: {e}")
 
         # 3. 顧客一覧Embed再更新
-        await update_overview_channel()
+        schedule_overview_update()
         results.append("✅ 顧客一覧更新")
 
         result_text = "\n".join(results)
@@ -734,6 +1181,7 @@ async def update_overview_channel():
 
         message = await channel.send(embeds=embeds, view=view)
         overview_message_id = message.id
+        _save_overview_state()
 
     except Exception as e:
         print(f"[ERROR] Failed to update overview: {e}")
@@ -755,45 +1203,44 @@ async def update_atelier_thread_status(order_id, new_status: CustomerStatus):
     config = STATUS_CONFIG[new_status]
     target_prefix = f"#{order_id} "
 
-    # アクティブスレッドから該当注文を検索
-    for thread in forum.threads:
-        if target_prefix in thread.name:
-            try:
-                # スレッド名の絵文字更新
-                new_name = re.sub(
-                    r'^[\U0001F7E0\U0001F7E1\U0001F535\U0001F7E2\u2705\U0001F4E6\U0001F389\U0001F490\U0001F64F]\s*',
-                    '',
-                    thread.name
-                )
-                new_name = f"{config['emoji']} {new_name}"
-                kwargs = {'name': new_name}
-
-                # フォーラムタグ更新
-                target_tag = None
-                for tag in forum.available_tags:
-                    if config['label'] in tag.name or config['emoji'] in (getattr(tag, 'emoji', None) or ''):
-                        target_tag = tag
-                        break
-                if target_tag:
-                    kwargs['applied_tags'] = [target_tag]
+    # インデックスからO(1)でスレッド解決（ミス時のみ線形走査にフォールバック）
+    target_thread = None
+    indexed_id = _atelier_order_thread_index.get(str(order_id))
+    if indexed_id:
+        target_thread = forum.get_thread(indexed_id)
+    if target_thread is None:
+        for thread in forum.threads:
+            if target_prefix in thread.name:
+                target_thread = thread
+                break
 
-                await thread.edit(**kwargs)
-                print(f"[Atelier] Updated thread: {new_name}")
-            except Exception as e:
-                print(f"[Atelier] Thread update failed: {e}")
-            return
+    if target_thread is not None:
+        _atelier_order_thread_index[str(order_id)] = target_thread.id
+        try:
+            # スレッド名の絵文字更新
+            new_name = _strip_status_emoji(target_thread.name)
+            new_name = f"{config['emoji']} {new_name}"
+            kwargs = {'name': new_name}
+
+            # フォーラムタグ更新
+            target_tag = _get_status_tag(forum, new_status)
+            if target_tag:
+                kwargs['applied_tags'] = [target_tag]
+
+            await target_thread.edit(**kwargs)
+            print(f"[Atelier] Updated thread: {new_name}")
+        except Exception as e:
+            print(f"[Atelier] Thread update failed: {e}")
+        return
 
     # アーカイブスレッドも検索
     try:
         async for thread in forum.archived_threads(limit=50):
             if target_prefix in thread.name:
                 try:
+                    _atelier_order_thread_index[str(order_id)] = thread.id
                     await thread.edit(archived=False)
-                    new_name = re.sub(
-                        r'^[\U0001F7E0\U0001F7E1\U0001F535\U0001F7E2\u2705\U0001F4E6\U0001F389\U0001F490\U0001F64F]\s*',
-                        '',
-                        thread.name
-                    )
+                    new_name = _strip_status_emoji(thread.name)
                     new_name = f"{config['emoji']} {new_name}"
                     await thread.edit(name=new_name)
                     print(f"[Atelier] Updated archived thread: {new_name}")
@@ -839,16 +1286,21 @@ async def archive_channel_to_forum(channel, customer_name=None):
         if not customer_name:
             customer_name = channel.name.replace("line-", "")
 
-        from datetime import datetime
         year_month = datetime.now().strftime("%Y-%m")
 
         thread_title = f"[{year_month}] {customer_name} 様"
 
-        messages = []
+        # 1パス目: 件数と期間のみ集計（Messageオブジェクト500件を保持しない）
+        msg_count = 0
+        first_ts = None
+        last_ts = None
         async for msg in channel.history(limit=500, oldest_first=True):
-            messages.append(msg)
+            if first_ts is None:
+                first_ts = msg.created_at
+            last_ts = msg.created_at
+            msg_count += 1
 
-        if not messages:
+        if msg_count == 0:
             thread, _ = await forum.create_thread(
                 name=thread_title,
                 content=f"📋 {customer_name} 様のやり取り履歴\n（メッセージなし）"
@@ -856,8 +1308,8 @@ async def archive_channel_to_forum(channel, customer_name=None):
         else:
             first_content = f"📋 **{customer_name} 様** のやり取り履歴\n"
             first_content += f"━━━━━━━━━━━━━━━━━━━━━━\n"
-            first_content += f"📅 期間: {messages[0].created_at.strftime('%Y-%m-%d')} 〜 {messages[-1].created_at.strftime('%Y-%m-%d')}\n"
-            first_content += f"💬 メッセージ数: {len(messages)}件\n"
+            first_content += f"📅 期間: {first_ts.strftime('%Y-%m-%d')} 〜 {last_ts.strftime('%Y-%m-%d')}\n"
+            first_content += f"💬 メッセージ数: {msg_count}件\n"
             first_content += f"━━━━━━━━━━━━━━━━━━━━━━"
 
             applied_tags = []
@@ -872,7 +1324,10 @@ async def archive_channel_to_forum(channel, customer_name=None):
                 applied_tags=applied_tags[:5] if applied_tags else None
             )
 
-            for msg in messages:
+            # 2パス目: 整形しながらストリーミングで5件ずつ並行送信
+            # （discord.pyがバケット毎に直列化するためレートリミットは安全）
+            batch = []
+            async for msg in channel.history(limit=500, oldest_first=True):
                 timestamp = msg.created_at.strftime("%m/%d %H:%M")
                 author = msg.author.display_name
 
@@ -887,7 +1342,12 @@ async def archive_channel_to_forum(channel, customer_name=None):
                     formatted = f"**[{timestamp}] {author}**\n" + "\n".join(content_parts)
                     if len(formatted) > 2000:
                         formatted = formatted[:1997] + "..."
-                    await thread.send(formatted)
+                    batch.append(formatted)
+                    if len(batch) >= 5:
+                        await asyncio.gather(*(thread.send(f) for f in batch))
+                        batch = []
+            if batch:
+                await asyncio.gather(*(thread.send(f) for f in batch))
 
         print(f"[OK] Archived to forum: {thread_title}")
 
@@ -898,7 +1358,6 @@ async def archive_channel_to_forum(channel, customer_name=None):
 
     except Exception as e:
         print(f"[ERROR] Failed to archive: {e}")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -913,6 +1372,20 @@ async def on_ready():
     print(f"[OK] Logged in as: {bot.user}")
     print(f"[OK] Application ID: {bot.application_id}")
 
+    # 共有aiohttpセッションをイベントループ上で作成
+    get_http_session()
+
+    # LINE/IG転送ワーカーを起動
+    start_outbound_workers()
+
+    # 一覧メッセージIDの復元とデバウンス更新タスク
+    load_overview_state()
+    start_overview_debouncer()
+
+    # テンプレートボタンメッセージIDの復元と書き出しタスク
+    load_template_button_msgs()
+    start_button_msgs_flusher()
+
     # Persistent Viewを登録（Bot再起動後もボタンが動作・テンプレート動的生成）
     bot.add_view(create_template_view())
     bot.add_view(StatusChangeView())
@@ -951,11 +1424,47 @@ async def on_ready():
             except Exception as e:
                 print(f"[WARN] Failed to sync commands to {label} guild: {e}")
 
+    # アトリエフォーラムの 注文ID → スレッドID インデックスを構築
+    try:
+        forum_id = get_forum_atelier()
+        guild_obj = bot.get_guild(int(get_guild_id())) if get_guild_id() else None
+        forum = guild_obj.get_channel(int(forum_id)) if (forum_id and guild_obj) else None
+        if isinstance(forum, discord.ForumChannel):
+            for thread in forum.threads:
+                id_match = _ORDER_NUM_RE.search(thread.name)
+                if id_match:
+                    _atelier_order_thread_index[id_match.group(1)] = thread.id
+            # ステータス → タグの対応も事前計算
+            for status in CustomerStatus:
+                _get_status_tag(forum, status)
+            print(f"[OK] Atelier thread index built ({len(_atelier_order_thread_index)} entries)")
+    except Exception as e:
+        print(f"[WARN] Failed to build atelier thread index: {e}")
+
     await update_overview_channel()
     print("[OK] Overview channel updated")
     print("=" * 50)
 
 
+@bot.event
+async def on_thread_create(thread: discord.Thread):
+    """アトリエフォーラムの新規スレッドをインデックスに登録"""
+    forum_atelier = get_forum_atelier()
+    if not forum_atelier or str(thread.parent_id) != str(forum_atelier):
+        return
+    id_match = _ORDER_NUM_RE.search(thread.name)
+    if id_match:
+        _atelier_order_thread_index[id_match.group(1)] = thread.id
+
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    """アトリエフォーラムのタグ構成変更 → タグキャッシュを無効化"""
+    forum_atelier = get_forum_atelier()
+    if forum_atelier and str(after.id) == str(forum_atelier):
+        _forum_tag_index.pop(after.id, None)
+
+
 def is_inquiry_thread(thread):
     """問い合わせスレッドかどうか判定（絵文字変更後も正しく判定）"""
     name = thread.name if hasattr(thread, 'name') else str(thread)
@@ -968,7 +1477,7 @@ def is_inquiry_thread(thread):
             if '問い合わせ' in tag.name or 'inquiry' in tag.name.lower():
                 return True
     # 3. #番号 が小さい（WooCommerce注文は通常1000以上）
-    id_match = re.search(r'#(\d+)', name)
+    id_match = _ORDER_NUM_RE.search(name)
     if id_match and int(id_match.group(1)) < 100:
         return True
     return False
@@ -978,7 +1487,7 @@ async def handle_atelier_message(message):
     """#atelier フォーラムのメッセージをWordPress webhook に転送"""
     # スレッド名からIDを取得（例: "🟡 #1865 はるか 様" or "💬 #1 石橋伯昂 様"）
     thread_name = message.channel.name
-    id_match = re.search(r'#(\d+)', thread_name)
+    id_match = _ORDER_NUM_RE.search(thread_name)
     if not id_match:
         print(f"[Atelier] Could not extract ID from thread: {thread_name}")
         return
@@ -1002,7 +1511,7 @@ async def handle_atelier_message(message):
     # 画像URL（最初の画像添付のみ）→ プロキシ経由で公開URLに変換
     image_url = ""
     for attachment in message.attachments:
-        if attachment.content_type and attachment.content_type.startswith("image/"):
+        if attachment.content_type and attachment.content_type.startswith(_IMAGE_PREFIX):
             proxied = proxy_image_for_line(attachment.url)
             if proxied:
                 image_url = proxied
@@ -1022,19 +1531,21 @@ async def handle_atelier_message(message):
         payload["order_id"] = int(target_id)
 
     try:
-        resp = requests.post(webhook_url, json=payload, headers={
+        async with get_http_session().post(webhook_url, json=payload, headers={
             "X-Atelier-Secret": secret,
             "Content-Type": "application/json",
-        }, timeout=10)
+        }, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            status = resp.status
+            body = await resp.text()
 
         label = f"inquiry={target_id}" if is_inquiry else f"order={target_id}"
-        if resp.status_code == 200:
+        if status == 200:
             await message.add_reaction("✅")
             print(f"[Atelier] Forwarded to WP: {label}")
         else:
             await message.add_reaction("❌")
-            print(f"[Atelier] WP webhook failed: {resp.status_code} {resp.text}")
-    except Exception as e:
+            print(f"[Atelier] WP webhook failed: {status} {body}")
+    except aiohttp.ClientError as e:
         await message.add_reaction("❌")
         print(f"[Atelier] Webhook error: {e}")
 
@@ -1042,7 +1553,6 @@ async def handle_atelier_message(message):
 @bot.event
 async def on_error(event, *args, **kwargs):
     """エラーログ"""
-    import traceback
     print(f"[ERROR] Event: {event}")
     traceback.print_exc()
 
@@ -1051,7 +1561,6 @@ async def on_error(event, *args, **kwargs):
 async def on_app_command_error(interaction: discord.Interaction, error):
     """アプリコマンドエラー"""
     print(f"[ERROR] App command error: {error}")
-    import traceback
     traceback.print_exc()
 
 
@@ -1064,14 +1573,15 @@ async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     channel = bot.get_channel(payload.channel_id)
     if not isinstance(channel, discord.Thread):
         return
-    if not get_forum_atelier() or str(channel.parent_id) != str(get_forum_atelier()):
+    forum_atelier = get_forum_atelier()
+    if not forum_atelier or str(channel.parent_id) != str(forum_atelier):
         return
 
     emoji = str(payload.emoji)
     if emoji not in ('👀', '✨'):
         return
 
-    id_match = re.search(r'#(\d+)', channel.name)
+    id_match = _ORDER_NUM_RE.search(channel.name)
     if not id_match:
         return
 
@@ -1094,14 +1604,14 @@ async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
                 reaction_payload["inquiry_id"] = int(target_id)
             else:
                 reaction_payload["order_id"] = int(target_id)
-            resp = requests.post(f"{base_url}/reaction", json=reaction_payload, headers={
+            async with get_http_session().post(f"{base_url}/reaction", json=reaction_payload, headers={
                 "X-Atelier-Secret": secret,
                 "Content-Type": "application/json",
-            }, timeout=10)
-            if resp.status_code == 200:
-                print(f"[Atelier Reaction] ✨ sent for {'inquiry' if is_inquiry else 'order'}={target_id}")
-            else:
-                print(f"[Atelier Reaction] Failed: {resp.status_code} {resp.text}")
+            }, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                if resp.status == 200:
+                    print(f"[Atelier Reaction] ✨ sent for {'inquiry' if is_inquiry else 'order'}={target_id}")
+                else:
+                    print(f"[Atelier Reaction] Failed: {resp.status} {await resp.text()}")
         elif emoji == '👀':
             # 既読のみ
             mark_read_payload = {"mark_read": True}
@@ -1109,15 +1619,15 @@ async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
                 mark_read_payload["inquiry_id"] = int(target_id)
             else:
                 mark_read_payload["order_id"] = int(target_id)
-            resp = requests.post(webhook_url, json=mark_read_payload, headers={
+            async with get_http_session().post(webhook_url, json=mark_read_payload, headers={
                 "X-Atelier-Secret": secret,
                 "Content-Type": "application/json",
-            }, timeout=10)
-            if resp.status_code == 200:
-                print(f"[Atelier Reaction] 👀 mark-read for {'inquiry' if is_inquiry else 'order'}={target_id}")
-            else:
-                print(f"[Atelier Reaction] Failed: {resp.status_code} {resp.text}")
-    except Exception as e:
+            }, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                if resp.status == 200:
+                    print(f"[Atelier Reaction] 👀 mark-read for {'inquiry' if is_inquiry else 'order'}={target_id}")
+                else:
+                    print(f"[Atelier Reaction] Failed: {resp.status} {await resp.text()}")
+    except aiohttp.ClientError as e:
         print(f"[Atelier Reaction] Error: {e}")
 
 
@@ -1154,7 +1664,7 @@ async def on_thread_update(before: discord.Thread, after: discord.Thread):
         return
 
     # スレッド名からIDとタイプを取得
-    id_match = re.search(r'#(\d+)', after.name)
+    id_match = _ORDER_NUM_RE.search(after.name)
     if not id_match:
         return
     target_id = int(id_match.group(1))
@@ -1164,7 +1674,7 @@ async def on_thread_update(before: discord.Thread, after: discord.Thread):
     try:
         status_enum = CustomerStatus(new_status)
         config = STATUS_CONFIG[status_enum]
-        new_name = re.sub(r'^[^\s#]+\s*', f"{config['emoji']} ", after.name)
+        new_name = _NAME_PREFIX_RE.sub(f"{config['emoji']} ", after.name)
         if new_name != after.name:
             await after.edit(name=new_name)
     except (ValueError, Exception) as e:
@@ -1178,35 +1688,36 @@ async def on_thread_update(before: discord.Thread, after: discord.Thread):
 
     try:
         if is_inquiry:
-            resp = requests.post(
+            async with get_http_session().post(
                 f"{wc_url}/wp-json/i-tategu/v1/atelier/inquiry/status",
                 json={"inquiry_id": target_id, "status": new_status},
                 headers={"X-Atelier-Secret": secret},
-                timeout=10,
-            )
+                timeout=aiohttp.ClientTimeout(total=10),
+            ) as resp:
+                status, body = resp.status, await resp.text()
         else:
             # WooCommerce 注文ステータス更新
-            wc_status_map = {
-                "purchased": "designing",
-                "design-confirmed": "design-confirmed",
-                "produced": "produced",
-                "shipped": "shipped",
-            }
-            wc_status = wc_status_map.get(new_status, new_status)
+            wc_status = _WC_STATUS_MAP.get(new_status, new_status)
             wc_key = os.environ.get("WC_CONSUMER_KEY", "")
             wc_secret = os.environ.get("WC_CONSUMER_SECRET", "")
-            resp = requests.put(
+            if _wc_status_done_recently(target_id, wc_status):
+                print(f"[Thread Tag Sync] skip (recently set): order={target_id} → {wc_status}")
+                return
+            async with get_http_session().put(
                 f"{wc_url}/wp-json/wc/v3/orders/{target_id}",
                 json={"status": wc_status},
-                auth=(wc_key, wc_secret),
-                timeout=10,
-            )
+                auth=aiohttp.BasicAuth(wc_key, wc_secret),
+                timeout=aiohttp.ClientTimeout(total=10),
+            ) as resp:
+                status, body = resp.status, await resp.text()
+            if status == 200:
+                _mark_wc_status(target_id, wc_status)
 
         label = f"{'inquiry' if is_inquiry else 'order'}={target_id}"
-        if resp.status_code == 200:
+        if status == 200:
             print(f"[Thread Tag Sync] ✅ {label} → {new_status}")
         else:
-            print(f"[Thread Tag Sync] ❌ {label}: {resp.status_code} {resp.text[:100]}")
+            print(f"[Thread Tag Sync] ❌ {label}: {status} {body[:100]}")
     except Exception as e:
         print(f"[Thread Tag Sync] Error: {e}")
 
@@ -1221,7 +1732,7 @@ async def on_thread_update(before: discord.Thread, after: discord.Thread):
             print(f"[Thread Tag Sync] customers.json update failed: {e}")
 
     # 顧客一覧を更新
-    await update_overview_channel()
+    schedule_overview_update()
 
 
 @bot.event
@@ -1231,7 +1742,8 @@ async def on_message(message):
 
     # アトリエフォーラムスレッド内のメッセージ → テンプレートボタン再投稿
     if isinstance(message.channel, discord.Thread):
-        is_atelier_forum = get_forum_atelier() and str(message.channel.parent_id) == str(get_forum_atelier())
+        forum_atelier = get_forum_atelier()
+        is_atelier_forum = forum_atelier and str(message.channel.parent_id) == str(forum_atelier)
         if is_atelier_forum:
             thread_key = str(message.channel.id)
             # 自分が投稿したボタンメッセージは無視（ループ防止）
@@ -1253,8 +1765,9 @@ async def on_message(message):
     await bot.process_commands(message)
 
     # ── #atelier フォーラムスレッド → WordPress webhook 転送 ──
-    if isinstance(message.channel, discord.Thread) and get_forum_atelier():
-        if str(message.channel.parent_id) == str(get_forum_atelier()):
+    forum_atelier = get_forum_atelier()
+    if isinstance(message.channel, discord.Thread) and forum_atelier:
+        if str(message.channel.parent_id) == str(forum_atelier):
             await handle_atelier_message(message)
             return  # LINE転送は不要
 
@@ -1272,20 +1785,15 @@ async def on_message(message):
             return
         # 通常チャンネル → LINE 送信（従来互換）
         if message.content and not message.content.startswith("!"):
-            success = send_line_message(line_user_id, [{"type": "text", "text": message.content}])
-            if success:
-                await message.add_reaction("✅")
-            else:
-                await message.add_reaction("❌")
-        for attachment in message.attachments:
-            if attachment.content_type and attachment.content_type.startswith("image/"):
-                public_url = proxy_image_for_line(attachment.url)
-                if public_url:
-                    send_line_message(line_user_id, [{
-                        "type": "image",
-                        "originalContentUrl": public_url,
-                        "previewImageUrl": public_url
-                    }])
+            await enqueue_outbound("line", line_user_id, [{"type": "text", "text": message.content}], message, "✅")
+        image_payloads = [
+            _line_image_payload(public_url)
+            for attachment in message.attachments
+            if attachment.content_type and attachment.content_type.startswith(_IMAGE_PREFIX)
+            and (public_url := proxy_image_for_line(attachment.url))
+        ]
+        for i in range(0, len(image_payloads), 5):
+            await enqueue_outbound("line", line_user_id, image_payloads[i:i + 5], None, "🖼️")
         return
 
     # ── フォーラムスレッド内: プラットフォーム判定 ──
@@ -1302,18 +1810,12 @@ async def on_message(message):
 
         # テキスト送信
         if message.content and not message.content.startswith("!"):
-            success = send_instagram_message(ig_user_id, message.content)
-            if success:
-                await message.add_reaction("✅")
-            else:
-                await message.add_reaction("❌")
-
-        # 画像送信
-        for attachment in message.attachments:
-            if attachment.content_type and attachment.content_type.startswith("image/"):
-                success = send_instagram_image(ig_user_id, attachment.url)
-                if success:
-                    await message.add_reaction("🖼️")
+            await enqueue_outbound("instagram_text", ig_user_id, message.content, message, "✅")
+
+        # 画像送信（ワーカーが並行処理）
+        for att in message.attachments:
+            if att.content_type and att.content_type.startswith(_IMAGE_PREFIX):
+                await enqueue_outbound("instagram_image", ig_user_id, att.url, message, "🖼️")
         return
 
     # ── LINE スレッドの場合（従来ロジック）──
@@ -1321,27 +1823,25 @@ async def on_message(message):
     if not line_user_id:
         starter = message.channel.starter_message
         if starter:
-            match = re.search(r'LINE User ID:\s*`?([A-Za-z0-9]+)`?', starter.content)
+            match = _LINE_USER_ID_RE.search(starter.content)
             if match:
                 line_user_id = match.group(1)
 
         if not line_user_id:
             async for msg in message.channel.history(limit=5, oldest_first=True):
                 if msg.content:
-                    match = re.search(r'LINE User ID:\s*`?([A-Za-z0-9]+)`?', msg.content)
+                    match = _LINE_USER_ID_RE.search(msg.content)
                     if match:
                         line_user_id = match.group(1)
                         print(f"[DEBUG] Found LINE User ID in content: {line_user_id}")
                         break
 
                 for embed in msg.embeds:
-                    embed_text = ""
-                    if embed.description:
-                        embed_text += embed.description
-                    for field in embed.fields:
-                        embed_text += f" {field.name} {field.value}"
-
-                    match = re.search(r'LINE User ID:\s*`?([A-Za-z0-9]+)`?', embed_text)
+                    # 大半はdescriptionにIDがあるので、まずそちらだけ検索
+                    match = _LINE_USER_ID_RE.search(embed.description) if embed.description else None
+                    if not match and embed.fields:
+                        fields_text = " ".join(f"{f.name} {f.value}" for f in embed.fields)
+                        match = _LINE_USER_ID_RE.search(fields_text)
                     if match:
                         line_user_id = match.group(1)
                         print(f"[DEBUG] Found LINE User ID in embed: {line_user_id}")
@@ -1350,6 +1850,10 @@ async def on_message(message):
                 if line_user_id:
                     break
 
+        # スキャンで見つかった場合は書き戻して次回以降のスキャンを不要にする
+        if line_user_id:
+            persist_thread_mapping(line_user_id, thread_id)
+
     if not line_user_id:
         print(f"[DEBUG] No LINE User ID found for channel: {message.channel.name}")
         return
@@ -1360,12 +1864,15 @@ async def on_message(message):
     all_line_users = get_all_line_users_from_thread(thread_id)
     if len(all_line_users) > 1:
         has_content = message.content and not message.content.startswith("!")
-        attachment_data = []
-        for att in message.attachments:
-            if att.content_type and att.content_type.startswith("image/"):
-                public_url = proxy_image_for_line(att.url)
-                if public_url:
-                    attachment_data.append({'url': public_url, 'content_type': att.content_type})
+        if not message.attachments:
+            attachment_data = ()  # テキストのみの共通パスはリスト生成も省く
+        else:
+            attachment_data = []
+            for att in message.attachments:
+                if att.content_type and att.content_type.startswith(_IMAGE_PREFIX):
+                    public_url = proxy_image_for_line(att.url)
+                    if public_url:
+                        attachment_data.append({'url': public_url, 'content_type': att.content_type})
         if has_content or attachment_data:
             view = ReplyTargetView(all_line_users, message.content if has_content else "", attachment_data)
             names = " / ".join(u['display_name'] for u in all_line_users)
@@ -1374,28 +1881,19 @@ async def on_message(message):
 
     # テキストメッセージ送信（単一ユーザー）
     if message.content and not message.content.startswith("!"):
-        success = send_line_message(line_user_id, [
+        await enqueue_outbound("line", line_user_id, [
             {"type": "text", "text": message.content}
-        ])
-        if success:
-            await message.add_reaction("✅")
-        else:
-            await message.add_reaction("❌")
+        ], message, "✅")
 
-    # 画像送信
-    for attachment in message.attachments:
-        if attachment.content_type and attachment.content_type.startswith("image/"):
-            public_url = proxy_image_for_line(attachment.url)
-            if public_url:
-                success = send_line_message(line_user_id, [
-                    {
-                        "type": "image",
-                        "originalContentUrl": public_url,
-                        "previewImageUrl": public_url
-                    }
-                ])
-                if success:
-                    await message.add_reaction("🖼️")
+    # 画像送信（1回のpushに最大5枚までまとめる）
+    image_payloads = [
+        _line_image_payload(public_url)
+        for attachment in message.attachments
+        if attachment.content_type and attachment.content_type.startswith(_IMAGE_PREFIX)
+        and (public_url := proxy_image_for_line(attachment.url))
+    ]
+    for i in range(0, len(image_payloads), 5):
+        await enqueue_outbound("line", line_user_id, image_payloads[i:i + 5], message, "🖼️")
 
 
 # ================== Button Interactions ==================
@@ -1408,24 +1906,10 @@ async def on_interaction(interaction: discord.Interaction):
 
     custom_id = interaction.data.get("custom_id", "")
 
-    # B2用コピーボタン
-    if custom_id.startswith("b2_copy_"):
-        order_id = custom_id.replace("b2_copy_", "")
-        await handle_b2_copy(interaction, order_id)
-
-    # B2自動入力ボタン（キューセット）
-    elif custom_id.startswith("b2_autofill_"):
-        order_id = custom_id.replace("b2_autofill_", "")
-        await handle_b2_autofill(interaction, order_id)
-
-    # /s コマンドのコピーボタン
-    elif custom_id.startswith("s_copy_"):
-        await handle_s_copy(interaction, custom_id)
-
-    # 発送完了ボタン
-    elif custom_id.startswith("shipped_"):
-        order_id = custom_id.replace("shipped_", "")
-        await handle_shipped(interaction, order_id)
+    for prefix, handler, strip_prefix in _INTERACTION_HANDLERS:
+        if custom_id.startswith(prefix):
+            await handler(interaction, custom_id[len(prefix):] if strip_prefix else custom_id)
+            return
 
 
 def parse_shipping_from_embed(message):
@@ -1445,8 +1929,7 @@ def parse_shipping_from_embed(message):
             data["price"] = field.value
     # タイトルから名前を取得: "🟡 未発送 | #INQ-X name 様"
     if embed.title:
-        import re
-        m = re.search(r'\|\s*#\S+\s+(.+?)\s*様', embed.title)
+        m = _EMBED_TITLE_NAME_RE.search(embed.title)
         if m:
             data["name"] = m.group(1)
     # 住所を解析: "851-2102 長崎県西彼杵郡時津町浜田郷721-1"
@@ -1457,13 +1940,12 @@ def parse_shipping_from_embed(message):
             data["postcode"] = parts[0]
             full = parts[1]
             # 都道府県を分離
-            import re
-            pm = re.match(r'(北海道|.{2,3}[都道府県])(.*)', full)
+            pm = _PREF_RE.match(full)
             if pm:
                 data["state"] = pm.group(1)
                 rest = pm.group(2)
                 # 市区町村と番地の分離（数字の直前まで）
-                cm = re.match(r'(.+?[市区町村郡])(.*)', rest)
+                cm = _CITY_RE.match(rest)
                 if cm:
                     data["city"] = cm.group(1)
                     data["address1"] = cm.group(2).strip()
@@ -1477,6 +1959,65 @@ def parse_shipping_from_embed(message):
     return data
 
 
+# WooCommerce注文の短期キャッシュ（B2コピー→発送完了のような連続クリックで二度取得しない）
+_order_cache = OrderedDict()
+_ORDER_CACHE_TTL = 30
+_ORDER_CACHE_MAX = 256
+
+
+def _invalidate_order_cache(order_id):
+    """注文キャッシュを破棄する（ステータス変更後など）"""
+    _order_cache.pop(str(order_id), None)
+
+
+async def fetch_order(order_id):
+    """WooCommerce注文を取得する（TTL付きLRUキャッシュ）
+    Returns: (order_dict | None, HTTPステータス)
+    """
+    key = str(order_id)
+    cached = _order_cache.get(key)
+    if cached and time.monotonic() - cached[0] < _ORDER_CACHE_TTL:
+        _order_cache.move_to_end(key)
+        return cached[1], 200
+
+    wc_url = get_wc_url()
+    wc_key = get_wc_consumer_key()
+    wc_secret = get_wc_consumer_secret()
+    url = f"{wc_url}/wp-json/wc/v3/orders/{order_id}"
+    async with get_http_session().get(
+        url, auth=aiohttp.BasicAuth(wc_key, wc_secret),
+        timeout=aiohttp.ClientTimeout(total=10)
+    ) as response:
+        status = response.status
+        order = await response.json() if status == 200 else None
+
+    if order is not None:
+        _order_cache[key] = (time.monotonic(), order)
+        _order_cache.move_to_end(key)
+        if len(_order_cache) > _ORDER_CACHE_MAX:
+            _order_cache.popitem(last=False)
+    return order, status
+
+
+# WooCommerceステータスPUTの重複抑止（同じ注文×ステータスの連続更新をスキップ）
+_wc_status_recent = {}
+
+
+def _wc_status_done_recently(order_id, status):
+    """直近60秒以内に同じステータスをPUT済みならTrue"""
+    now = time.monotonic()
+    if len(_wc_status_recent) > 64:
+        for k, ts in list(_wc_status_recent.items()):
+            if now - ts > 300:
+                del _wc_status_recent[k]
+    return now - _wc_status_recent.get((str(order_id), status), float('-inf')) < 60
+
+
+def _mark_wc_status(order_id, status):
+    """PUT成功を記録する"""
+    _wc_status_recent[(str(order_id), status)] = time.monotonic()
+
+
 async def handle_b2_autofill(interaction: discord.Interaction, order_id: str):
     """B2自動入力キューをセット（Tampermonkeyがポーリングで検出）"""
     await interaction.response.defer(ephemeral=True)
@@ -1498,17 +2039,19 @@ async def handle_b2_autofill(interaction: discord.Interaction, order_id: str):
             if shipping_data:
                 payload["shipping_data"] = shipping_data
 
-        response = requests.post(
+        async with get_http_session().post(
             url,
             json=payload,
             headers={
                 "X-Shipping-Token": shipping_token,
                 "Content-Type": "application/json",
-            }
-        )
+            },
+            timeout=aiohttp.ClientTimeout(total=10),
+        ) as response:
+            status = response.status
+            data = await response.json() if status == 200 else None
 
-        if response.status_code == 200:
-            data = response.json()
+        if status == 200:
             if data.get("success"):
                 await interaction.followup.send(
                     f"✅ 注文 #{order_id} をB2自動入力キューにセットしました\n"
@@ -1518,7 +2061,7 @@ async def handle_b2_autofill(interaction: discord.Interaction, order_id: str):
             else:
                 await interaction.followup.send(f"キュー設定失敗: {data}", ephemeral=True)
         else:
-            await interaction.followup.send(f"API呼び出し失敗: {response.status_code}", ephemeral=True)
+            await interaction.followup.send(f"API呼び出し失敗: {status}", ephemeral=True)
 
     except Exception as e:
         await interaction.followup.send(f"エラー: {e}", ephemeral=True)
@@ -1562,24 +2105,18 @@ async def handle_b2_copy(interaction: discord.Interaction, order_id: str):
             await interaction.followup.send("WooCommerce設定がありません", ephemeral=True)
             return
 
-        url = f"{wc_url}/wp-json/wc/v3/orders/{order_id}"
-        response = requests.get(url, auth=(wc_key, wc_secret))
-        if response.status_code != 200:
-            await interaction.followup.send(f"注文取得失敗: {response.status_code}", ephemeral=True)
+        order, status = await fetch_order(order_id)
+        if status != 200:
+            await interaction.followup.send(f"注文取得失敗: {status}", ephemeral=True)
             return
-
-        order = response.json()
         billing = order.get('billing', {})
         shipping = order.get('shipping', {})
 
         # 発送先情報
-        postcode = shipping.get('postcode') or billing.get('postcode', '')
-        state = shipping.get('state') or billing.get('state', '')
-        city = shipping.get('city') or billing.get('city', '')
-        address1 = shipping.get('address_1') or billing.get('address_1', '')
-        address2 = shipping.get('address_2') or billing.get('address_2', '')
+        postcode, state, city, address1, address2 = _pick_shipping(
+            shipping, billing, 'postcode', 'state', 'city', 'address_1', 'address_2')
 
-        state_name = JP_STATES.get(state, state)
+        state_name = _jp_state_name(state)
 
         full_address = f"{city}{address1}"
         if address2:
@@ -1616,6 +2153,16 @@ async def handle_b2_copy(interaction: discord.Interaction, order_id: str):
         await interaction.followup.send(f"エラー: {e}", ephemeral=True)
 
 
+# 発送完了時の無効化ボタン行（custom_idだけ都度差し替える）
+_SHIPPED_DISABLED_TEMPLATE = {
+    "type": 1,
+    "components": [
+        {"type": 2, "style": 2, "label": "📋 B2用コピー", "custom_id": "", "disabled": True},
+        {"type": 2, "style": 2, "label": "✅ 発送完了", "custom_id": "", "disabled": True},
+    ],
+}
+
+
 async def handle_shipped(interaction: discord.Interaction, order_id: str):
     """発送完了処理"""
     await interaction.response.defer()
@@ -1631,30 +2178,39 @@ async def handle_shipped(interaction: discord.Interaction, order_id: str):
 
     try:
         url = f"{wc_url}/wp-json/wc/v3/orders/{order_id}"
-        response = requests.put(url, auth=(wc_key, wc_secret), json={"status": "completed"})
-
-        if response.status_code == 200:
+        if _wc_status_done_recently(order_id, "completed"):
+            status = 200  # 直近に同じ更新済み（ダブルクリック等）
+        else:
+            async with get_http_session().put(
+                url, auth=aiohttp.BasicAuth(wc_key, wc_secret),
+                json={"status": "completed"}, timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                status = response.status
+            if status == 200:
+                _mark_wc_status(order_id, "completed")
+
+        if status == 200:
+            _invalidate_order_cache(order_id)
             # メッセージを更新（ボタン無効化 + 色変更）
             message = interaction.message
-            embed = message.embeds[0].to_dict() if message.embeds else {}
-            embed["title"] = embed.get("title", "").replace("🟡 未発送", "✅ 発送済み")
-            embed["color"] = 0x2ECC71  # 緑
+            # 既存Embedをdict経由で再構築せず、その場で書き換える
+            if message.embeds:
+                new_embed = message.embeds[0]
+                new_embed.title = (new_embed.title or "").replace("🟡 未発送", "✅ 発送済み")
+            else:
+                new_embed = discord.Embed()
+            new_embed.colour = discord.Colour(0x2ECC71)  # 緑
 
             # ボタンを無効化
-            disabled_components = [
-                {
-                    "type": 1,
-                    "components": [
-                        {"type": 2, "style": 2, "label": "📋 B2用コピー", "custom_id": f"b2_copy_{order_id}", "disabled": True},
-                        {"type": 2, "style": 2, "label": "✅ 発送完了", "custom_id": f"shipped_{order_id}", "disabled": True},
-                    ]
-                }
-            ]
+            row = copy.deepcopy(_SHIPPED_DISABLED_TEMPLATE)
+            row["components"][0]["custom_id"] = f"b2_copy_{order_id}"
+            row["components"][1]["custom_id"] = f"shipped_{order_id}"
+            disabled_components = [row]
 
-            await message.edit(embed=discord.Embed.from_dict(embed), components=disabled_components)
+            await message.edit(embed=new_embed, components=disabled_components)
             await interaction.followup.send(f"✅ 注文 #{order_id} を発送済みに更新しました")
         else:
-            await interaction.followup.send(f"ステータス更新失敗: {response.status_code}")
+            await interaction.followup.send(f"ステータス更新失敗: {status}")
 
     except Exception as e:
         await interaction.followup.send(f"エラー: {e}")
@@ -1682,13 +2238,10 @@ async def handle_s_copy(interaction: discord.Interaction, custom_id: str):
         return
 
     try:
-        url = f"{wc_url}/wp-json/wc/v3/orders/{order_id}"
-        response = requests.get(url, auth=(wc_key, wc_secret))
-        if response.status_code != 200:
-            await interaction.followup.send(f"注文取得失敗: {response.status_code}", ephemeral=True)
+        order, status = await fetch_order(order_id)
+        if status != 200:
+            await interaction.followup.send(f"注文取得失敗: {status}", ephemeral=True)
             return
-
-        order = response.json()
         billing = order.get('billing', {})
         shipping = order.get('shipping', {})
 
@@ -1702,11 +2255,9 @@ async def handle_s_copy(interaction: discord.Interaction, custom_id: str):
             value = shipping.get('postcode') or billing.get('postcode', '')
             label = "郵便番号"
         elif field == "addr":
-            state = shipping.get('state') or billing.get('state', '')
-            state_name = JP_STATES.get(state, state)
-            city = shipping.get('city') or billing.get('city', '')
-            address1 = shipping.get('address_1') or billing.get('address_1', '')
-            address2 = shipping.get('address_2') or billing.get('address_2', '')
+            state, city, address1, address2 = _pick_shipping(
+                shipping, billing, 'state', 'city', 'address_1', 'address_2')
+            state_name = _jp_state_name(state)
             value = f"{state_name}{city}{address1}"
             if address2:
                 value += f" {address2}"
@@ -1723,6 +2274,15 @@ async def handle_s_copy(interaction: discord.Interaction, custom_id: str):
 
 # ================== Slash Commands ==================
 
+# custom_idプレフィックス → ハンドラの対応表
+# 第3要素: プレフィックスを剥がして渡すか（s_copyはフィールド名を含むため生のまま）
+_INTERACTION_HANDLERS = (
+    ("b2_copy_", handle_b2_copy, True),
+    ("b2_autofill_", handle_b2_autofill, True),
+    ("s_copy_", handle_s_copy, False),
+    ("shipped_", handle_shipped, True),
+)
+
 @bot.tree.command(name="s", description="出荷先情報を表示")
 async def shipping_info(interaction: discord.Interaction):
     """スレッドから注文IDを取得し、出荷先情報をEmbed+コピーボタンで表示"""
@@ -1737,7 +2297,7 @@ async def shipping_info(interaction: discord.Interaction):
         return
 
     # スレッド名から注文ID抽出
-    match = re.search(r'#(\d+)', channel.name)
+    match = _ORDER_NUM_RE.search(channel.name)
     if not match:
         await interaction.followup.send("スレッド名から注文番号を取得できません（#数字 が必要）", ephemeral=True)
         return
@@ -1753,24 +2313,18 @@ async def shipping_info(interaction: discord.Interaction):
         return
 
     try:
-        url = f"{wc_url}/wp-json/wc/v3/orders/{order_id}"
-        response = requests.get(url, auth=(wc_key, wc_secret))
-        if response.status_code != 200:
-            await interaction.followup.send(f"注文 #{order_id} の取得に失敗しました (HTTP {response.status_code})", ephemeral=True)
+        order, status = await fetch_order(order_id)
+        if status != 200:
+            await interaction.followup.send(f"注文 #{order_id} の取得に失敗しました (HTTP {status})", ephemeral=True)
             return
-
-        order = response.json()
         billing = order.get('billing', {})
         shipping = order.get('shipping', {})
 
         customer_name = f"{billing.get('last_name', '')} {billing.get('first_name', '')}"
         phone = billing.get('phone', '')
-        postcode = shipping.get('postcode') or billing.get('postcode', '')
-        state = shipping.get('state') or billing.get('state', '')
-        state_name = JP_STATES.get(state, state)
-        city = shipping.get('city') or billing.get('city', '')
-        address1 = shipping.get('address_1') or billing.get('address_1', '')
-        address2 = shipping.get('address_2') or billing.get('address_2', '')
+        postcode, state, city, address1, address2 = _pick_shipping(
+            shipping, billing, 'postcode', 'state', 'city', 'address_1', 'address_2')
+        state_name = _jp_state_name(state)
         full_address = f"{state_name}{city}{address1}"
         if address2:
             full_address += f" {address2}"
@@ -1853,6 +2407,7 @@ async def change_status(interaction: discord.Interaction, new_status: str):
     if not customer:
         add_customer(line_user_id, channel.name.replace("line-", ""), str(channel.id))
 
+    prev_status = customer.get('status') if customer else None
     update_customer_status(line_user_id, status)
 
     config = STATUS_CONFIG[status]
@@ -1868,13 +2423,17 @@ async def change_status(interaction: discord.Interaction, new_status: str):
     elif status != CustomerStatus.SHIPPED and get_category_active():
         await move_channel_to_category(channel, get_category_active())
 
-    # アトリエフォーラムスレッドも連動更新
+    # アトリエフォーラムスレッドも連動更新（複数注文は並行実行）
     customer = get_customer(line_user_id)
     if customer and customer.get('orders'):
-        for order in customer['orders']:
-            await update_atelier_thread_status(order['order_id'], status)
+        await asyncio.gather(
+            *(update_atelier_thread_status(o['order_id'], status) for o in customer['orders']),
+            return_exceptions=True,
+        )
 
-    await update_overview_channel()
+    # 同じステータスへの再設定なら一覧の再構築は不要
+    if prev_status != status.value:
+        schedule_overview_update()
 
 
 @bot.tree.command(name="atelier-url", description="アトリエURLを表示")
@@ -1892,13 +2451,10 @@ async def atelier_url(interaction: discord.Interaction, order_id: int):
         return
 
     try:
-        url = f"{wc_url}/wp-json/wc/v3/orders/{order_id}"
-        response = requests.get(url, auth=(wc_key, wc_secret))
-        if response.status_code != 200:
-            await interaction.followup.send(f"注文 #{order_id} が見つかりません (HTTP {response.status_code})", ephemeral=True)
+        order, status = await fetch_order(order_id)
+        if status != 200:
+            await interaction.followup.send(f"注文 #{order_id} が見つかりません (HTTP {status})", ephemeral=True)
             return
-
-        order = response.json()
         meta = {m['key']: m['value'] for m in order.get('meta_data', [])}
         atelier_token = meta.get('_atelier_token')
 
@@ -1947,7 +2503,7 @@ async def notify_check(interaction: discord.Interaction):
 
     thread_name = thread.name
     is_inquiry = thread_name.startswith('💬')
-    id_match = re.search(r'#(\d+)', thread_name)
+    id_match = _ORDER_NUM_RE.search(thread_name)
     if not id_match:
         await interaction.followup.send("スレッド名からIDを取得できません", ephemeral=True)
         return
@@ -1963,9 +2519,13 @@ async def notify_check(interaction: discord.Interaction):
 
     secret = get_atelier_webhook_secret()
     try:
-        resp = requests.get(api_url, headers={"X-Atelier-Secret": secret}, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
+        async with get_http_session().get(
+            api_url, headers={"X-Atelier-Secret": secret},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as resp:
+            status = resp.status
+            data = await resp.json() if status == 200 else None
+        if status == 200:
             count = data.get('count', 0)
             if count > 0:
                 emoji = "🔔"
@@ -1980,7 +2540,7 @@ async def notify_check(interaction: discord.Interaction):
                 ephemeral=True
             )
         else:
-            await interaction.followup.send(f"確認失敗: HTTP {resp.status_code}", ephemeral=True)
+            await interaction.followup.send(f"確認失敗: HTTP {status}", ephemeral=True)
     except Exception as e:
         await interaction.followup.send(f"エラー: {e}", ephemeral=True)
 
@@ -2011,7 +2571,7 @@ async def register_customer(interaction: discord.Interaction):
     add_customer(line_user_id, display_name, str(channel.id))
 
     await interaction.response.send_message(f"✅ {display_name}様を顧客リストに登録しました")
-    await update_overview_channel()
+    schedule_overview_update()
 
 
 # ================== Template System ==================
@@ -2058,22 +2618,28 @@ class ReplyTargetSelect(discord.ui.Select):
         else:
             targets = [u for u in self.line_users if u['line_user_id'] == selected]
 
+        # 画像ペイロードは全宛先で共有（宛先×枚数ぶんの再構築をしない）
+        image_payloads = [
+            _line_image_payload(att['url'])
+            for att in self.attachments
+            if att.get('content_type', '').startswith(_IMAGE_PREFIX)
+        ]
+
         results = []
         for user in targets:
             uid = user['line_user_id']
             name = user['display_name']
 
             if self.message_content:
-                success = send_line_message(uid, [{"type": "text", "text": self.message_content}])
+                success = await send_line_message(uid, [{"type": "text", "text": self.message_content}])
                 results.append(f"{'✅' if success else '❌'} {name}")
 
-            for att in self.attachments:
-                if att.get('content_type', '').startswith("image/"):
-                    send_line_message(uid, [{
-                        "type": "image",
-                        "originalContentUrl": att['url'],
-                        "previewImageUrl": att['url']
-                    }])
+            if image_payloads:
+                # LINEのpushは1回5メッセージまでなのでまとめて送信
+                await asyncio.gather(*(
+                    send_line_message(uid, image_payloads[i:i + 5])
+                    for i in range(0, len(image_payloads), 5)
+                ))
 
         target_names = ", ".join(u['display_name'] for u in targets)
         await interaction.response.edit_message(
@@ -2132,14 +2698,14 @@ class TemplateEditModal(discord.ui.Modal):
                     payload["inquiry_id"] = int(self.order_id)
                 else:
                     payload["order_id"] = int(self.order_id)
-                resp = requests.post(webhook_url, json=payload, headers={
+                async with get_http_session().post(webhook_url, json=payload, headers={
                     "X-Atelier-Secret": secret,
                     "Content-Type": "application/json",
-                }, timeout=10)
-                if resp.status_code == 200:
-                    all_success = True
-                else:
-                    print(f"[Atelier Template] Webhook failed: {resp.status_code} {resp.text}")
+                }, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                    if resp.status == 200:
+                        all_success = True
+                    else:
+                        print(f"[Atelier Template] Webhook failed: {resp.status} {await resp.text()}")
             except Exception as e:
                 print(f"[Atelier Template] Webhook error: {e}")
 
@@ -2149,92 +2715,107 @@ class TemplateEditModal(discord.ui.Modal):
 
         results.append("✅ アトリエ送信完了")
 
-        # 2. WooCommerceステータス更新（注文のみ、問い合わせはスキップ）
         status_action = self.template.get("status_action")
-        if status_action and self.order_id and not self.is_inquiry:
+        thread = interaction.channel
+
+        # 2. WooCommerceステータス更新（注文のみ、問い合わせはスキップ）
+        async def _update_wc():
+            out = []
+            if not (status_action and self.order_id and not self.is_inquiry):
+                return out
             wc_url = get_wc_url()
             wc_key = get_wc_consumer_key()
             wc_secret = get_wc_consumer_secret()
-
-            if all([wc_url, wc_key, wc_secret]):
-                try:
-                    url = f"{wc_url}/wp-json/wc/v3/orders/{self.order_id}"
-                    resp = requests.put(url, auth=(wc_key, wc_secret), json={"status": status_action})
-                    if resp.status_code == 200:
-                        results.append(f"✅ WooCommerce → {status_action}")
-                    else:
-                        results.append(f"⚠️ WooCommerce更新失敗 ({resp.status_code})")
-                except Exception as e:
-                    results.append(f"⚠️ WooCommerceエラー: {e}")
-
-        # 3. customer_managerステータス更新（注文のみ）
-        if status_action and self.order_id and not self.is_inquiry:
+            if not all([wc_url, wc_key, wc_secret]):
+                return out
             try:
-                new_status = CustomerStatus(status_action)
-                update_linked_customer_statuses(self.order_id, new_status)
-                results.append("✅ 顧客ステータス更新")
-            except ValueError:
-                pass
-
-        # 4. フォーラムスレッドの名前更新（絵文字変更）
-        if status_action:
+                if _wc_status_done_recently(self.order_id, status_action):
+                    out.append(f"✅ WooCommerce → {status_action}（更新済み）")
+                else:
+                    url = f"{wc_url}/wp-json/wc/v3/orders/{self.order_id}"
+                    async with get_http_session().put(
+                        url, auth=aiohttp.BasicAuth(wc_key, wc_secret),
+                        json={"status": status_action}, timeout=aiohttp.ClientTimeout(total=10)
+                    ) as resp:
+                        if resp.status == 200:
+                            _mark_wc_status(self.order_id, status_action)
+                            out.append(f"✅ WooCommerce → {status_action}")
+                        else:
+                            out.append(f"⚠️ WooCommerce更新失敗 ({resp.status})")
+            except Exception as e:
+                out.append(f"⚠️ WooCommerceエラー: {e}")
+            return out
+
+        # 4+5. スレッド名とタグは1回のeditにまとめて更新
+        async def _update_thread():
+            out = []
+            if not status_action:
+                return out
             try:
                 new_status = CustomerStatus(status_action)
                 config = STATUS_CONFIG[new_status]
-                thread = interaction.channel
-                new_name = re.sub(
-                    r'^[\U0001F7E0\U0001F7E1\U0001F535\U0001F7E2\u2705\U0001F4E6\U0001F389\U0001F490\U0001F64F]\s*',
-                    f"{config['emoji']} ",
-                    thread.name
-                )
-                if new_name != thread.name:
-                    await thread.edit(name=new_name)
-                    results.append("✅ スレッド名更新")
-            except Exception as e:
-                print(f"[WARN] Thread name update failed: {e}")
-
-        # 5. フォーラムタグ更新
-        if status_action:
-            try:
-                thread = interaction.channel
+                kwargs = {}
+                # 先頭がステータス絵文字のときだけ差し替え（従来のre.sub互換）
+                if thread.name and thread.name[0] in _STATUS_EMOJIS:
+                    new_name = f"{config['emoji']} {_strip_status_emoji(thread.name)}"
+                    if new_name != thread.name:
+                        kwargs['name'] = new_name
                 forum = thread.parent
                 if forum and isinstance(forum, discord.ForumChannel):
-                    new_status = CustomerStatus(status_action)
-                    config = STATUS_CONFIG[new_status]
-                    target_tag = None
-                    for tag in forum.available_tags:
-                        if config['label'] in tag.name or config['emoji'] in (getattr(tag, 'emoji', None) or ''):
-                            target_tag = tag
-                            break
-
+                    target_tag = _get_status_tag(forum, new_status)
                     if target_tag:
-                        await thread.edit(applied_tags=[target_tag])
-                        results.append(f"✅ タグ更新: {target_tag.name}")
+                        kwargs['applied_tags'] = [target_tag]
+                if kwargs:
+                    await thread.edit(**kwargs)
+                    if 'name' in kwargs:
+                        out.append("✅ スレッド名更新")
+                    if 'applied_tags' in kwargs:
+                        out.append(f"✅ タグ更新: {kwargs['applied_tags'][0].name}")
             except Exception as e:
-                print(f"[WARN] Tag update failed: {e}")
+                print(f"[WARN] Thread update failed: {e}")
+            return out
 
         # 6. アトリエフォーラムスレッド連動更新
-        if status_action and self.order_id:
-            try:
-                new_status = CustomerStatus(status_action)
-                await update_atelier_thread_status(self.order_id, new_status)
-                results.append("✅ アトリエスレッド更新")
-            except Exception as e:
-                print(f"[WARN] Atelier thread update failed: {e}")
+        async def _update_atelier():
+            out = []
+            if status_action and self.order_id:
+                try:
+                    await update_atelier_thread_status(self.order_id, CustomerStatus(status_action))
+                    out.append("✅ アトリエスレッド更新")
+                except Exception as e:
+                    print(f"[WARN] Atelier thread update failed: {e}")
+            return out
 
         # 7. スレッドに送信記録を投稿
-        from datetime import datetime
-        thread = interaction.channel
-        sent_embed = discord.Embed(
-            description=message_text,
-            color=0x06C755
+        async def _post_record():
+            sent_embed = discord.Embed(
+                description=message_text,
+                color=0x06C755
+            )
+            sent_embed.set_author(name=f"📤 {self.template['label']}")
+            sent_embed.set_footer(text=f"アトリエ送信済み • {datetime.now().strftime('%m/%d %H:%M')}")
+            await thread.send(embed=sent_embed)
+            return []
+
+        # 3. customer_managerステータス更新（ローカルI/Oなので同期のまま）
+        if status_action and self.order_id and not self.is_inquiry:
+            try:
+                update_linked_customer_statuses(self.order_id, CustomerStatus(status_action))
+                results.append("✅ 顧客ステータス更新")
+            except ValueError:
+                pass
+
+        # 2,4-7は互いに独立したAPI呼び出しなので並行実行
+        step_results = await asyncio.gather(
+            _update_wc(), _update_thread(), _update_atelier(), _post_record(),
+            return_exceptions=True,
         )
-        sent_embed.set_author(name=f"📤 {self.template['label']}")
-        sent_embed.set_footer(text=f"アトリエ送信済み • {datetime.now().strftime('%m/%d %H:%M')}")
-        await thread.send(embed=sent_embed)
+        for r in step_results:
+            if isinstance(r, list):
+                results.extend(r)
 
         # 8. 顧客一覧を更新
-        await update_overview_channel()
+        schedule_overview_update()
 
         # テンプレートボタン自動表示は無効化（/template で手動表示）
 
@@ -2242,21 +2823,23 @@ class TemplateEditModal(discord.ui.Modal):
         await interaction.followup.send("\n".join(results), ephemeral=True)
 
 
+# ステータスアクション → ボタンスタイル（View生成ごとに辞書を作らない）
+_STATUS_STYLES = {
+    'design-confirmed': discord.ButtonStyle.primary,
+    'produced': discord.ButtonStyle.primary,
+    'shipped': discord.ButtonStyle.success,
+}
+
+
 def create_template_view():
     """テンプレート一覧からボタンViewを動的生成（追加テンプレートも全て表示）"""
     templates = load_templates()
     view = discord.ui.View(timeout=None)
 
-    STATUS_STYLES = {
-        'design-confirmed': discord.ButtonStyle.primary,
-        'produced': discord.ButtonStyle.primary,
-        'shipped': discord.ButtonStyle.success,
-    }
-
     max_tpl = 4 * 5  # rows 0-3 で最大20テンプレート
     for i, tpl in enumerate(templates[:max_tpl]):
         row = i // 5
-        style = STATUS_STYLES.get(tpl.get('status_action'), discord.ButtonStyle.secondary)
+        style = _STATUS_STYLES.get(tpl.get('status_action'), discord.ButtonStyle.secondary)
 
         btn = discord.ui.Button(
             label=tpl['label'],
@@ -2295,8 +2878,7 @@ def create_template_view():
 
 async def _handle_template_button(interaction: discord.Interaction, template_id: str):
     """テンプレートボタン押下時の共通処理"""
-    templates = load_templates()
-    template = next((t for t in templates if t["id"] == template_id), None)
+    template = load_templates_by_id().get(template_id)
     if not template:
         await interaction.response.send_message("テンプレートが見つかりません", ephemeral=True)
         return
@@ -2306,7 +2888,8 @@ async def _handle_template_button(interaction: discord.Interaction, template_id:
         await interaction.response.send_message("スレッド内で使用してください", ephemeral=True)
         return
 
-    if not get_forum_atelier() or str(thread.parent_id) != str(get_forum_atelier()):
+    forum_atelier = get_forum_atelier()
+    if not forum_atelier or str(thread.parent_id) != str(forum_atelier):
         await interaction.response.send_message("❌ アトリエフォーラムのスレッド内で使用してください", ephemeral=True)
         return
 
@@ -2361,7 +2944,9 @@ class OptionPaymentSelect(discord.ui.Select):
 
 async def _handle_manage_button(interaction: discord.Interaction):
     """テンプレート管理メニュー"""
-    templates = load_templates()
+    # 先にdeferしておけば3秒の応答期限がファイル読み込みに左右されない
+    await interaction.response.defer(ephemeral=True)
+    templates = await aload_templates()
     options = []
     for t in templates:
         options.append(discord.SelectOption(
@@ -2378,7 +2963,7 @@ async def _handle_manage_button(interaction: discord.Interaction):
     view = discord.ui.View(timeout=120)
     select = TemplateManageSelect(options)
     view.add_item(select)
-    await interaction.response.send_message("編集するテンプレートを選択:", view=view, ephemeral=True)
+    await interaction.followup.send("編集するテンプレートを選択:", view=view, ephemeral=True)
 
 
 class TemplateManageSelect(discord.ui.Select):
@@ -2393,8 +2978,7 @@ class TemplateManageSelect(discord.ui.Select):
             modal = TemplateManageModal(template_id=None, label="", text="", is_new=True)
             await interaction.response.send_modal(modal)
         else:
-            templates = load_templates()
-            template = next((t for t in templates if t["id"] == selected), None)
+            template = (await asyncio.to_thread(load_templates_by_id)).get(selected)
             if not template:
                 await interaction.response.send_message("テンプレートが見つかりません", ephemeral=True)
                 return
@@ -2418,9 +3002,9 @@ class TemplateManageSelect(discord.ui.Select):
                 no_btn = discord.ui.Button(label="キャンセル", style=discord.ButtonStyle.secondary)
 
                 async def _yes(i2):
-                    tpls = load_templates()
+                    tpls = await aload_templates()
                     tpls = [t for t in tpls if t["id"] != template["id"]]
-                    save_templates(tpls)
+                    await asave_templates(tpls)
                     await i2.response.edit_message(content=f"✅ 「{template['label']}」を削除しました", view=None)
 
                 async def _no(i2):
@@ -2467,7 +3051,7 @@ class TemplateManageModal(discord.ui.Modal):
         self.add_item(self.text_input)
 
     async def on_submit(self, interaction: discord.Interaction):
-        templates = load_templates()
+        templates = await aload_templates()
 
         if self.is_new:
             new_id = f"custom_{len(templates) + 1}"
@@ -2478,7 +3062,7 @@ class TemplateManageModal(discord.ui.Modal):
                 "status_action": None,
                 "text": self.text_input.value,
             })
-            save_templates(templates)
+            await asave_templates(templates)
             # 新テンプレートのボタンを有効にするためPersistent Viewを再登録
             bot.add_view(create_template_view())
             await interaction.response.send_message(
@@ -2487,12 +3071,14 @@ class TemplateManageModal(discord.ui.Modal):
                 ephemeral=True
             )
         else:
+            # 保存対象のtemplatesリスト自身から引く（load_templatesを再呼び出しすると
+            # バンドル版マージ直後などに別オブジェクトが返り、編集が保存されない）
             for t in templates:
                 if t["id"] == self.template_id:
                     t["label"] = self.label_input.value
                     t["text"] = self.text_input.value
                     break
-            save_templates(templates)
+            await asave_templates(templates)
             bot.add_view(create_template_view())
             await interaction.response.send_message(
                 f"✅ テンプレート「{self.label_input.value}」を更新しました",
@@ -2504,26 +3090,22 @@ async def post_template_buttons(thread):
     """テンプレートボタンをスレッドに投稿（前回のを削除して常に最下部に表示）"""
     thread_key = str(thread.id)
 
-    # ループ防止
-    if thread_key in _posting_buttons_lock:
-        return
-    _posting_buttons_lock.add(thread_key)
-
-    try:
-        # 前回のボタンメッセージを削除
+    lock = _lock_for(thread.id)
+    if lock.locked():
+        return  # 同一スレッドへの再入はスキップ（従来のset互換）
+    async with lock:
+        # 前回のボタンメッセージを削除（partial messageなら事前fetch不要で1往復）
         old_msg_id = _template_button_msg_ids.get(thread_key)
         if old_msg_id:
             try:
-                old_msg = await thread.fetch_message(old_msg_id)
-                await old_msg.delete()
+                await thread.get_partial_message(old_msg_id).delete()
             except Exception:
                 pass
 
         view = create_template_view()
         msg = await thread.send(view=view)
         _template_button_msg_ids[thread_key] = msg.id
-    finally:
-        _posting_buttons_lock.discard(thread_key)
+        _mark_button_msgs_dirty()
 
 
 @bot.tree.command(name="template-cleanup", description="全スレッドのテンプレートボタンを一括削除")
@@ -2568,7 +3150,8 @@ async def send_template(interaction: discord.Interaction):
         )
         return
 
-    if not get_forum_atelier() or str(channel.parent_id) != str(get_forum_atelier()):
+    forum_atelier = get_forum_atelier()
+    if not forum_atelier or str(channel.parent_id) != str(forum_atelier):
         await interaction.response.send_message(
             "このコマンドは #atelier フォーラムのスレッド内で使用してください",
             ephemeral=True
@@ -2583,9 +3166,9 @@ async def send_template(interaction: discord.Interaction):
 # ================== API Endpoints ==================
 
 @api.route("/api/status", methods=["POST"])
-def api_update_status():
+async def api_update_status():
     """ステータス更新API"""
-    data = request.json
+    data = await request.get_json()
 
     order_id = data.get("order_id")
     new_status = data.get("status")
@@ -2605,26 +3188,24 @@ def api_update_status():
 
     update_customer_status(line_user_id, status, order_id)
 
-    asyncio.run_coroutine_threadsafe(update_overview_channel(), bot.loop)
+    schedule_overview_update()
 
     if status == CustomerStatus.SHIPPED and get_category_shipped():
         channel_id = customer.get("discord_channel_id")
         if channel_id:
-            async def move_channel():
-                guild = bot.get_guild(int(get_guild_id()))
-                if guild:
-                    channel = guild.get_channel(int(channel_id))
-                    if channel:
-                        await move_channel_to_category(channel, get_category_shipped())
-            asyncio.run_coroutine_threadsafe(move_channel(), bot.loop)
+            # guild/channelはキャッシュ読みなのでその場で解決し、移動だけタスク化
+            guild = bot.get_guild(int(get_guild_id()))
+            channel = guild.get_channel(int(channel_id)) if guild else None
+            if channel:
+                asyncio.create_task(move_channel_to_category(channel, get_category_shipped()))
 
     return jsonify({"success": True, "status": new_status})
 
 
 @api.route("/api/customer", methods=["POST"])
-def api_add_customer():
+async def api_add_customer():
     """顧客追加API"""
-    data = request.json
+    data = await request.get_json()
 
     line_user_id = data.get("line_user_id")
     display_name = data.get("display_name")
@@ -2637,15 +3218,15 @@ def api_add_customer():
 
     customer = add_customer(line_user_id, display_name, discord_channel_id, order_id, order_info)
 
-    asyncio.run_coroutine_threadsafe(update_overview_channel(), bot.loop)
+    schedule_overview_update()
 
     return jsonify({"success": True, "customer": customer})
 
 
 @api.route("/api/customer/delete", methods=["POST"])
-def api_delete_customer():
+async def api_delete_customer():
     """顧客削除API"""
-    data = request.json
+    data = await request.get_json()
     customer_key = data.get("customer_key")
     if not customer_key:
         return jsonify({"error": "customer_key required"}), 400
@@ -2654,21 +3235,21 @@ def api_delete_customer():
     if customer_key in customers:
         deleted = customers.pop(customer_key)
         save_customers(customers)
-        asyncio.run_coroutine_threadsafe(update_overview_channel(), bot.loop)
+        schedule_overview_update()
         return jsonify({"success": True, "deleted": deleted.get("display_name", "")})
     return jsonify({"error": "customer not found"}), 404
 
 
 @api.route("/api/overview", methods=["GET"])
-def api_get_overview():
+async def api_get_overview():
     """一覧取得API"""
     return jsonify(get_status_summary())
 
 
 @api.route("/api/mark-read", methods=["POST"])
-def api_mark_read():
+async def api_mark_read():
     """WordPress → Discord: お客様がメッセージを読んだ時に👀リアクション追加"""
-    data = request.get_json(force=True, silent=True) or {}
+    data = await request.get_json(force=True, silent=True) or {}
     discord_msg_ids = data.get("discord_message_ids", [])
     discord_thread_id = data.get("discord_thread_id", "")
 
@@ -2686,31 +3267,31 @@ def api_mark_read():
             except Exception as e:
                 print(f"[mark-read] Failed to add 👀 to {msg_id}: {e}")
 
-    asyncio.run_coroutine_threadsafe(add_reactions(), bot.loop)
+    asyncio.create_task(add_reactions())
     return jsonify({"status": "ok"})
 
 
 @api.route("/api/notify-changed", methods=["POST"])
-def api_notify_changed():
+async def api_notify_changed():
     """プッシュ通知登録変更 → 顧客一覧を更新"""
-    asyncio.run_coroutine_threadsafe(update_overview_channel(), bot.loop)
+    schedule_overview_update()
     return jsonify({"success": True})
 
 
 @api.route("/health", methods=["GET"])
-def health_check():
+async def health_check():
     """ヘルスチェック（Railway用）"""
     return jsonify({"status": "ok", "canva_enabled": CANVA_ENABLED})
 
 
 @api.route("/images/<filename>", methods=["GET"])
-def serve_proxy_image(filename):
+async def serve_proxy_image(filename):
     """プロキシ画像を配信（LINE APIからのアクセス用）"""
-    return send_from_directory(IMAGE_PROXY_DIR, filename)
+    return await send_from_directory(IMAGE_PROXY_DIR, filename)
 
 
 @api.route("/api/process-board", methods=["POST"])
-def api_process_board():
+async def api_process_board():
     """来店アプリ用：板写真4枚を背景透過＋余白付与して返す（同期）。
     Request JSON: {"base": "...", "images": {"1": b64, "2": b64, "3": b64, "4": b64}}
     Header:  X-Board-Secret （= env BOARD_PROCESS_SECRET）
@@ -2721,36 +3302,55 @@ def api_process_board():
     if not expected or not hmac.compare_digest(secret, expected):
         return jsonify({"error": "unauthorized"}), 401
 
-    data = request.get_json(silent=True) or {}
+    data = await request.get_json(silent=True) or {}
     images = data.get("images") or {}
     if not images:
         return jsonify({"error": "images required"}), 400
 
     try:
         from board_processor import process_board_image
-        out = {}
-        for pos, b64 in images.items():
-            raw = base64.b64decode(b64)
-            png = process_board_image(raw)
-            out[str(pos)] = base64.b64encode(png).decode("ascii")
+
+        # 画像処理はCPU負荷が高いためイベントループをブロックしないようスレッドで実行
+        def _process_all():
+            out = {}
+            for pos, b64 in images.items():
+                raw = base64.b64decode(b64)
+                png = process_board_image(raw)
+                out[str(pos)] = base64.b64encode(png).decode("ascii")
+            return out
+
+        out = await asyncio.to_thread(_process_all)
         return jsonify({"ok": True, "images": out})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 
+# Webhookシークレットのバイト列キャッシュ（リクエスト毎の.encode()を回避）
+_woo_secret_bytes_cache = (None, b"")
+
+
+def _get_woo_secret_bytes(secret):
+    global _woo_secret_bytes_cache
+    if _woo_secret_bytes_cache[0] != secret:
+        _woo_secret_bytes_cache = (secret, secret.encode('utf-8'))
+    return _woo_secret_bytes_cache[1]
+
+
 def verify_woo_webhook_signature(payload, signature, secret):
-    """WooCommerce Webhook署名をHMAC-SHA256で検証"""
+    """WooCommerce Webhook署名をHMAC-SHA256で検証（定数時間比較）"""
     if not secret or not signature:
         return False
-    expected = base64.b64encode(
-        hmac.new(secret.encode('utf-8'), payload, hashlib.sha256).digest()
-    ).decode('utf-8')
-    return hmac.compare_digest(expected, signature)
+    try:
+        sig_bytes = base64.b64decode(signature)
+    except Exception:
+        return False
+    digest = hmac.new(_get_woo_secret_bytes(secret), payload, hashlib.sha256).digest()
+    return hmac.compare_digest(digest, sig_bytes)
 
 
 @api.route("/api/woo-webhook", methods=["GET", "POST"])
-def woo_webhook():
+async def woo_webhook():
     """WooCommerce Webhook受信 → Canva自動化"""
     # GETリクエスト = WooCommerceのPingテスト
     if request.method == "GET":
@@ -2760,9 +3360,17 @@ def woo_webhook():
     webhook_source = request.headers.get("X-WC-Webhook-Source", "")
     webhook_topic = request.headers.get("X-WC-Webhook-Topic", "")
 
-    # Pingテスト検出（トピックがない、またはボディが空/webhook_idのみ）
-    raw_payload = request.get_data()
-    data = request.get_json(force=True, silent=True) or {}
+    # Pingテスト検出: トピックヘッダーだけで判定できる場合はボディを読む前に返す
+    if not webhook_topic or webhook_topic == "ping":
+        print(f"[Webhook] Ping test received from {webhook_source}")
+        return jsonify({"status": "ok", "message": "Webhook ping successful"})
+
+    # ボディはHMAC検証と共用するため一度だけ読み、一度だけパースする
+    raw_payload = await request.get_data()
+    try:
+        data = _json_loads(raw_payload) or {}
+    except Exception:
+        data = {}
     if not data or data.get("webhook_id") and not data.get("id"):
         print(f"[Webhook] Ping test received from {webhook_source}")
         return jsonify({"status": "ok", "message": "Webhook ping successful"})
@@ -2793,19 +3401,21 @@ def woo_webhook():
         return jsonify({"status": "skipped", "reason": f"order status: {order_status}"})
 
     try:
-        billing = data.get("billing", {})
-        customer_name = f"{billing.get('last_name', '')} {billing.get('first_name', '')}".strip()
+        billing = data.get("billing") or {}
+        last_name = billing.get("last_name") or ""
+        first_name = billing.get("first_name") or ""
+        customer_name = (last_name + " " + first_name).strip()
         email = billing.get("email", "")
+        items = data.get("line_items") or ()
         order_info = {
             "total": data.get("total", ""),
             "status": order_status,
-            "product": data.get("line_items", [{}])[0].get("name", "") if data.get("line_items") else "",
+            "product": items[0].get("name", "") if items else "",
         }
         add_order_customer(order_id, customer_name, email, order_info)
         print(f"[Webhook] Customer added/updated: {customer_name} ({email})")
         # 顧客一覧を更新
-        if bot.loop:
-            asyncio.run_coroutine_threadsafe(update_overview_channel(), bot.loop)
+        schedule_overview_update()
     except Exception as e:
         print(f"[WARN] Failed to add customer: {e}")
 
@@ -2815,85 +3425,72 @@ def woo_webhook():
         return jsonify({"status": "skipped", "reason": f"Order status '{order_status}' not ready"})
 
     # 必要な設定が揃っているか確認
-    if not all([get_canva_access_token(), get_canva_refresh_token(), get_wc_url(), get_wc_consumer_key(), get_wc_consumer_secret()]):
+    config = _canva_config()
+    if not all([config['canva_access_token'], config['canva_refresh_token'], config['wc_url'], config['wc_key'], config['wc_secret']]):
         print("[ERROR] Missing Canva or WooCommerce configuration")
         return jsonify({"error": "Missing configuration"}), 500
 
     # 非同期でCanva処理を実行（Webhookレスポンスを待たせない）
     def process_async():
         try:
-            config = {
-                'wc_url': get_wc_url(),
-                'wc_key': get_wc_consumer_key(),
-                'wc_secret': get_wc_consumer_secret(),
-                'canva_access_token': get_canva_access_token(),
-                'canva_refresh_token': get_canva_refresh_token(),
-                'discord_webhook': get_canva_webhook_url(),
-                'discord_bot_token': get_discord_token(),
-            }
             canva_process_order(order_id, config)
         except Exception as e:
             print(f"[ERROR] Canva processing failed: {e}")
-            import traceback
             traceback.print_exc()
+        finally:
+            _canva_token_cache["exp"] = 0  # 処理中の401リフレッシュでトークンが回転するため無効化
 
-    thread = threading.Thread(target=process_async, daemon=True)
-    thread.start()
+    _canva_executor.submit(process_async)
 
     return jsonify({"success": True, "message": f"Processing order #{order_id}"})
 
 
 @api.route("/api/canva/process", methods=["POST"])
-def api_canva_process():
+async def api_canva_process():
     """手動でCanva処理をトリガー（デバッグ用）"""
     if not CANVA_ENABLED:
         return jsonify({"error": "Canva handler not available"}), 503
 
-    data = request.json
+    data = await request.get_json()
     order_id = data.get("order_id")
 
     if not order_id:
         return jsonify({"error": "order_id required"}), 400
 
-    if not all([get_canva_access_token(), get_canva_refresh_token(), get_wc_url(), get_wc_consumer_key(), get_wc_consumer_secret()]):
+    config = _canva_config()
+    if not all([config['canva_access_token'], config['canva_refresh_token'], config['wc_url'], config['wc_key'], config['wc_secret']]):
         return jsonify({"error": "Missing configuration"}), 500
 
     # 同期で処理
     try:
-        config = {
-            'wc_url': get_wc_url(),
-            'wc_key': get_wc_consumer_key(),
-            'wc_secret': get_wc_consumer_secret(),
-            'canva_access_token': get_canva_access_token(),
-            'canva_refresh_token': get_canva_refresh_token(),
-            'discord_webhook': get_canva_webhook_url(),
-            'discord_bot_token': get_discord_token(),
-        }
-        result = canva_process_order(order_id, config)
+        result = await asyncio.get_running_loop().run_in_executor(
+            _canva_executor, canva_process_order, order_id, config
+        )
         return jsonify({"success": result, "order_id": order_id})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        _canva_token_cache["exp"] = 0  # 処理中の401リフレッシュでトークンが回転するため無効化
 
 
 @api.route("/api/canva/debug-process", methods=["POST"])
-def api_canva_debug_process():
+async def api_canva_debug_process():
     """詳細デバッグ付きCanva処理"""
-    from canva_handler import get_order_from_woocommerce, parse_order_data
+    if not CANVA_ENABLED:
+        return jsonify({"error": "Canva handler not available"}), 503
 
-    data = request.json
+    data = await request.get_json()
     order_id = data.get("order_id")
     debug = {"order_id": order_id, "steps": []}
 
     # Step 1: Config check
-    config = {
-        'wc_url': get_wc_url(),
-        'wc_key': get_wc_consumer_key(),
-        'wc_secret': get_wc_consumer_secret(),
-    }
+    config = _canva_config()
     debug["steps"].append({"step": "config", "wc_url": config['wc_url'], "wc_key_set": bool(config['wc_key']), "wc_secret_set": bool(config['wc_secret'])})
 
     # Step 2: Get order
-    order = get_order_from_woocommerce(order_id, config['wc_url'], config['wc_key'], config['wc_secret'])
+    order = await asyncio.to_thread(
+        get_order_from_woocommerce, order_id, config['wc_url'], config['wc_key'], config['wc_secret']
+    )
     if not order:
         debug["steps"].append({"step": "get_order", "success": False, "error": "Order not found"})
         return jsonify(debug)
@@ -2928,26 +3525,21 @@ def api_canva_debug_process():
 
 
 @api.route("/api/canva/debug-import", methods=["POST"])
-def api_canva_debug_import():
+async def api_canva_debug_import():
     """Canvaインポートを直接テスト"""
-    from canva_handler import (
-        get_order_from_woocommerce, parse_order_data, create_pptx,
-        import_to_canva, refresh_canva_token
-    )
-    import tempfile
+    if not CANVA_ENABLED:
+        return jsonify({"error": "Canva handler not available"}), 503
 
-    data = request.json
+    data = await request.get_json()
     order_id = data.get("order_id")
     debug = {"order_id": order_id, "steps": []}
 
-    config = {
-        'wc_url': get_wc_url(),
-        'wc_key': get_wc_consumer_key(),
-        'wc_secret': get_wc_consumer_secret(),
-    }
+    config = _canva_config()
 
-    # Get order
-    order = get_order_from_woocommerce(order_id, config['wc_url'], config['wc_key'], config['wc_secret'])
+    # Get order（requestsベースの同期処理なのでスレッドで実行）
+    order = await asyncio.to_thread(
+        get_order_from_woocommerce, order_id, config['wc_url'], config['wc_key'], config['wc_secret']
+    )
     if not order:
         debug["error"] = "Order not found"
         return jsonify(debug)
@@ -2955,46 +3547,41 @@ def api_canva_debug_import():
     order_data = parse_order_data(order)
     debug["steps"].append({"step": "parse", "board": order_data.get('board_name')})
 
-    # Create PowerPoint
-    try:
+    # PPTX生成〜Canvaインポートはディスク・HTTP待ちが長いため丸ごとスレッドへ
+    def _build_and_import():
         with tempfile.TemporaryDirectory() as temp_dir:
             pptx_path = create_pptx(order_data, temp_dir)
             debug["steps"].append({"step": "pptx_created", "path": pptx_path})
-
-            # Check file size
-            import os as os_module
-            file_size = os_module.path.getsize(pptx_path)
-            debug["steps"].append({"step": "pptx_size", "bytes": file_size})
+            debug["steps"].append({"step": "pptx_size", "bytes": os.path.getsize(pptx_path)})
 
             # Get fresh token
             access_token = get_canva_access_token()
             refresh_token = get_canva_refresh_token()
 
-            # Try import
             canva_title = f"Test_{order_id}"
-            design, error_info = import_to_canva(pptx_path, canva_title, access_token, refresh_token)
+            return import_to_canva(pptx_path, canva_title, access_token, refresh_token)
 
-            if design:
-                debug["steps"].append({"step": "import_success", "design_id": design.get('id')})
-                debug["success"] = True
-            else:
-                debug["steps"].append({"step": "import_failed", "error": error_info})
-                debug["success"] = False
+    try:
+        design, error_info = await asyncio.to_thread(_build_and_import)
+        if design:
+            debug["steps"].append({"step": "import_success", "design_id": design.get('id')})
+            debug["success"] = True
+        else:
+            debug["steps"].append({"step": "import_failed", "error": error_info})
+            debug["success"] = False
 
     except Exception as e:
-        import traceback
         debug["error"] = str(e)
         debug["traceback"] = traceback.format_exc()
+    finally:
+        _canva_token_cache["exp"] = 0  # import中の401リフレッシュでトークンが回転するため無効化
 
     return jsonify(debug)
 
 
 @api.route("/api/canva/debug-token", methods=["GET"])
-def api_canva_debug_token():
+async def api_canva_debug_token():
     """Canvaトークンリフレッシュをテスト（デバッグ用）"""
-    import base64
-    import requests as req
-
     # 環境変数の状態
     client_id = os.environ.get("CANVA_CLIENT_ID", "OC-AZvUVtxGhbOD")
     client_secret = os.environ.get("CANVA_CLIENT_SECRET", "")
@@ -3018,29 +3605,31 @@ def api_canva_debug_token():
         credentials = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
 
         try:
-            response = req.post(url, data={
+            async with get_http_session().post(url, data={
                 'grant_type': 'refresh_token',
                 'refresh_token': refresh_token,
             }, headers={
                 'Authorization': f'Basic {credentials}',
                 'Content-Type': 'application/x-www-form-urlencoded',
-            })
+            }) as response:
+                status_code = response.status
+                body = await response.text()
 
-            debug_info["refresh_status_code"] = response.status_code
-            debug_info["refresh_response"] = response.text[:500] if response.text else ""
+            debug_info["refresh_status_code"] = status_code
+            debug_info["refresh_response"] = body[:500] if body else ""
 
-            if response.status_code == 200:
+            if status_code == 200:
                 debug_info["refresh_success"] = True
                 # Canvaはrefresh_tokenローテーションのため、新トークンを必ず保存
                 # 保存しないと次回呼び出し時に「used twice」エラーでチェーンが壊れる
                 try:
-                    from canva_handler import save_tokens_to_file
-                    tokens = response.json()
+                    tokens = _json_loads(body)
                     new_access = tokens.get('access_token')
                     new_refresh = tokens.get('refresh_token', refresh_token)
                     os.environ['CANVA_ACCESS_TOKEN'] = new_access
                     os.environ['CANVA_REFRESH_TOKEN'] = new_refresh
                     save_tokens_to_file(new_access, new_refresh)
+                    _canva_token_cache["exp"] = 0  # ローテーション後はキャッシュ無効化
                     debug_info["tokens_saved"] = True
                 except Exception as save_err:
                     debug_info["tokens_saved"] = False
@@ -3056,9 +3645,9 @@ def api_canva_debug_token():
 
 
 @api.route("/api/canva/update-tokens", methods=["POST"])
-def api_canva_update_tokens():
+async def api_canva_update_tokens():
     """Canvaトークンを手動で更新（ファイル永続化）"""
-    data = request.json
+    data = await request.get_json()
     access_token = data.get("access_token")
     refresh_token = data.get("refresh_token")
 
@@ -3073,8 +3662,8 @@ def api_canva_update_tokens():
     # ファイルにも保存（再起動後も維持）
     if access_token and refresh_token:
         try:
-            from canva_handler import save_tokens_to_file
             save_tokens_to_file(access_token, refresh_token)
+            _canva_token_cache["exp"] = 0  # 新トークン保存後はキャッシュ無効化
             updated['file_saved'] = True
         except Exception as e:
             updated['file_save_error'] = str(e)
@@ -3083,7 +3672,7 @@ def api_canva_update_tokens():
 
 
 @api.route("/api/canva/current-tokens", methods=["GET"])
-def api_canva_current_tokens():
+async def api_canva_current_tokens():
     """現在のCanvaトークン情報を取得（先頭50文字のみ）"""
     access = get_canva_access_token()
     refresh = get_canva_refresh_token()
@@ -3095,31 +3684,48 @@ def api_canva_current_tokens():
     })
 
 
-# OAuth認証用の状態保持
-_oauth_state = {}
+# OAuth認証用の状態保持（stateトークン → セッション、FIFOで上限管理）
+_oauth_state = OrderedDict()
+_OAUTH_STATE_MAX = 64
+
+
+def _purge_expired_oauth_state():
+    """期限切れのOAuthセッションを破棄する"""
+    now = time.time()
+    for key in [k for k, v in _oauth_state.items() if v['expires'] < now]:
+        del _oauth_state[key]
 
 @api.route("/api/canva/oauth/start", methods=["GET"])
-def api_canva_oauth_start():
+async def api_canva_oauth_start():
     """Canva OAuth認証URLを生成"""
-    import secrets
-    import hashlib
-
     client_id = os.environ.get("CANVA_CLIENT_ID", "OC-AZvUVtxGhbOD")
     redirect_uri = "https://i-tategu-shop.com/canva-callback/"
     scopes = "design:content:read design:content:write design:meta:read design:permission:read design:permission:write asset:read asset:write folder:read folder:write"
 
-    # PKCE生成
+    # PKCE生成（verifierはセッションごとに一意である必要がある）
     code_verifier = secrets.token_urlsafe(64)[:128]
     code_challenge = base64.urlsafe_b64encode(
         hashlib.sha256(code_verifier.encode()).digest()
     ).decode().rstrip('=')
 
-    # 状態保存（5分間有効）
-    import time
-    _oauth_state['code_verifier'] = code_verifier
-    _oauth_state['expires'] = time.time() + 300
-
-    params = f"response_type=code&client_id={client_id}&redirect_uri={redirect_uri}&scope={scopes}&code_challenge={code_challenge}&code_challenge_method=S256"
+    # 期限切れを掃除してから保存。満杯なら新規開始を拒否（メモリ上限）
+    _purge_expired_oauth_state()
+    if len(_oauth_state) >= _OAUTH_STATE_MAX:
+        return jsonify({"error": "Too many pending OAuth sessions. Try again later"}), 429
+
+    # セッションをstateキーで保存（5分間有効・並行フローでも上書きしない）
+    state = secrets.token_urlsafe(16)
+    _oauth_state[state] = {'code_verifier': code_verifier, 'expires': time.time() + 300}
+
+    params = urllib.parse.urlencode({
+        'response_type': 'code',
+        'client_id': client_id,
+        'redirect_uri': redirect_uri,
+        'scope': scopes,
+        'code_challenge': code_challenge,
+        'code_challenge_method': 'S256',
+        'state': state,
+    })
     auth_url = f"https://www.canva.com/api/oauth/authorize?{params}"
 
     return jsonify({
@@ -3129,28 +3735,31 @@ def api_canva_oauth_start():
 
 
 @api.route("/api/canva/oauth/callback", methods=["POST"])
-def api_canva_oauth_callback():
+async def api_canva_oauth_callback():
     """OAuth認証コードをトークンに交換"""
-    import time
-
-    data = request.json
+    data = await request.get_json()
     code = data.get("code")
 
     if not code:
         return jsonify({"error": "code required"}), 400
 
-    # 状態確認
-    if not _oauth_state.get('code_verifier') or time.time() > _oauth_state.get('expires', 0):
+    # 状態確認（stateキーで取得。旧手順互換でstate未指定なら直近セッションを使う）
+    state = data.get("state")
+    if state:
+        session = _oauth_state.pop(state, None)
+    else:
+        session = _oauth_state.popitem()[1] if _oauth_state else None
+    if not session or time.time() > session['expires']:
         return jsonify({"error": "OAuth session expired. Call /api/canva/oauth/start first"}), 400
 
-    code_verifier = _oauth_state['code_verifier']
+    code_verifier = session['code_verifier']
     client_id = os.environ.get("CANVA_CLIENT_ID", "OC-AZvUVtxGhbOD")
     client_secret = os.environ.get("CANVA_CLIENT_SECRET", "")
     redirect_uri = "https://i-tategu-shop.com/canva-callback/"
 
     # トークン交換
     auth = base64.b64encode(f'{client_id}:{client_secret}'.encode()).decode()
-    response = requests.post(
+    async with get_http_session().post(
         'https://api.canva.com/rest/v1/oauth/token',
         headers={
             'Authorization': f'Basic {auth}',
@@ -3162,12 +3771,10 @@ def api_canva_oauth_callback():
             'code_verifier': code_verifier,
             'redirect_uri': redirect_uri
         }
-    )
-
-    if response.status_code != 200:
-        return jsonify({"error": "Token exchange failed", "details": response.text}), 400
-
-    tokens = response.json()
+    ) as response:
+        if response.status != 200:
+            return jsonify({"error": "Token exchange failed", "details": await response.text()}), 400
+        tokens = await response.json()
     access_token = tokens.get('access_token')
     refresh_token = tokens.get('refresh_token')
 
@@ -3178,13 +3785,10 @@ def api_canva_oauth_callback():
 
         # ファイル保存
         try:
-            from canva_handler import save_tokens_to_file
             save_tokens_to_file(access_token, refresh_token)
         except Exception as e:
             print(f"[WARN] Failed to save tokens to file: {e}")
-
-        # 状態クリア
-        _oauth_state.clear()
+        _canva_token_cache["exp"] = 0  # 新トークン保存後はキャッシュ無効化
 
         return jsonify({
             "success": True,
@@ -3196,10 +3800,16 @@ def api_canva_oauth_callback():
     return jsonify({"error": "No tokens in response", "response": tokens}), 400
 
 
-def run_api():
-    """API サーバー起動"""
+async def main():
+    """Discord Bot と Quart API を同一イベントループで起動"""
     port = int(os.getenv("PORT", 5701))
-    api.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
+    try:
+        await asyncio.gather(
+            bot.start(get_discord_token()),
+            api.run_task(host="0.0.0.0", port=port),
+        )
+    finally:
+        await bot.close()
 
 
 # ================== Main ==================
@@ -3209,9 +3819,5 @@ if __name__ == "__main__":
         print("[ERROR] get_discord_token() not set")
         exit(1)
 
-    api_thread = threading.Thread(target=run_api, daemon=True)
-    api_thread.start()
-    print(f"[OK] API Server started")
-
-    print("[...] Starting Discord Bot...")
-    bot.run(get_discord_token())
+    print("[...] Starting Discord Bot + API Server...")
+    asyncio.run(main())
@@ -3,10 +3,35 @@
 スマホ・PCのブラウザから商品をWooCommerceに登録する
 """
 import os
+import asyncio
 import base64
+import bisect
+import re
+import threading
+import uuid
 import requests
-from functools import wraps
-from flask import request, jsonify, session, redirect, url_for, render_template_string
+from io import BytesIO
+from PIL import Image, ImageOps
+from types import MappingProxyType
+from functools import lru_cache, wraps
+from requests.adapters import HTTPAdapter, Retry
+from jinja2 import Template
+
+# orjsonがあれば高速なJSON処理を使う（未インストールなら標準ライブラリ）
+try:
+    import orjson
+    def _json_loads(data):
+        return orjson.loads(data)
+    def _json_dumps_bytes(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+    def _json_loads(data):
+        return json.loads(data)
+    def _json_dumps_bytes(obj):
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+from quart import request, jsonify, session, redirect, url_for, render_template_string
 
 # ===== 環境変数 =====
 def get_wp_url():
@@ -21,8 +46,21 @@ def get_wp_password():
 def get_register_password():
     return os.environ.get("PRODUCT_REGISTER_PASSWORD", "")
 
+# WP向け共有セッション（keep-alive・接続プール・一時エラーの自動リトライ）
+_session = requests.Session()
+_wp_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+)
+_session.mount("https://", _wp_adapter)
+_session.mount("http://", _wp_adapter)
+# 明示的に圧縮を要求（brotliパッケージがあればrequestsがbrも展開できる）
+_session.headers['Accept-Encoding'] = 'gzip, deflate, br'
+
 # ===== 木材データ =====
-WOOD_INFO = {
+# 参照専用データのため読み取り専用ビューで公開する（誤った破壊的変更を防ぐ）
+WOOD_INFO = MappingProxyType({
     "ケヤキ": {"meaning": "幸運・長寿・健康", "type": "広葉樹", "story": "「際立って優れた木」を意味する名を持つ日本の銘木。清水寺の舞台を1000年以上支え続けるその強さは、ふたりの人生を末永く見守る力そのものです。", "recommend": "堂々と、力強く歩んでいきたいカップルに。"},
     "サクラ": {"meaning": "精神美・優美な女性", "type": "広葉樹", "story": "日本人が最も愛する花の木。「精神の美しさ」を表すその花言葉は、心の美しさを誓い合うおふたりにぴったりの樹種です。", "recommend": "内面の美しさを大切にするカップルに。"},
     "エンジュ": {"meaning": "幸福・慕情・上品", "type": "広葉樹", "story": "「木」偏に「鬼」と書き、邪気を払う霊木。「幸福を招く木」として親しまれています。", "recommend": "幸福を招き入れたいカップルに。"},
@@ -46,9 +84,9 @@ WOOD_INFO = {
     "キハダ": {"meaning": "回想・癒やし", "type": "広葉樹", "story": "漢方薬「黄檗」の原料として古来より人を癒してきた木。", "recommend": "穏やかで温かい家庭を築きたいカップルに。"},
     "イチイ": {"meaning": "高潔・家庭円満", "type": "針葉樹", "story": "正一位の「一位」に通じることから、高貴な木として珍重されてきました。", "recommend": "高い志を持って新生活を始めたいカップルに。"},
     "アカシア": {"meaning": "真実の愛・友情", "type": "広葉樹", "story": "「真実の愛」を花言葉に持つアカシア。硬く丈夫な性質は、強い愛の絆を象徴しています。", "recommend": "揺るぎない真実の愛を誓いたいカップルに。"},
-}
+})
 
-WOOD_ROMAJI = {
+WOOD_ROMAJI = MappingProxyType({
     "ケヤキ": "Zelkova", "トチ": "Horse Chestnut", "サクラ": "Cherry",
     "ヤマザクラ": "Wild Cherry", "クス": "Camphor", "クリ": "Chestnut",
     "イチョウ": "Ginkgo", "ヒノキ": "Cypress", "スギ": "Cedar",
@@ -57,12 +95,23 @@ WOOD_ROMAJI = {
     "カエデ": "Maple", "メープル": "Maple", "エンジュ": "Pagoda Tree",
     "ホウ": "Magnolia", "キハダ": "Amur Cork", "イチイ": "Yew",
     "アカシア": "Acacia", "ヤマモモ": "Bayberry", "カイヅカイブキ": "Kaizuka Juniper",
-}
+})
+
+PRICE_MAP = MappingProxyType({"A": 30000, "B": 34000, "C": 38000, "D": 42000})
 
-PRICE_MAP = {"A": 30000, "B": 34000, "C": 38000, "D": 42000}
+# 商品名の連番抽出用（No.01 形式）
+_NO_RE = re.compile(r'No\.(\d+)')
+
+# 登録フォームの樹種プルダウン用（WOOD_INFOは定数なのでソートは一度だけ）
+_WOOD_TYPES_SORTED = sorted(WOOD_INFO.keys())
 
 # ===== ヘルパー関数 =====
+@lru_cache(maxsize=1)
 def _wp_auth_headers():
+    """WP認証ヘッダー（認証情報は起動後固定なので一度だけ組み立てる）
+
+    資格情報をローテーションした場合は _wp_auth_headers.cache_clear() を呼ぶ。
+    """
     credentials = f"{get_wp_user()}:{get_wp_password()}"
     token = base64.b64encode(credentials.encode()).decode()
     return {
@@ -70,47 +119,105 @@ def _wp_auth_headers():
         'User-Agent': 'i-tategu-product-register/1.0'
     }
 
+# 面積・スタンプ数の区分しきい値（bisectでテーブル引き）
+_AREA_THRESH = (100000, 180000, 280000)
+_AREA_LABELS = ("S（~40名）", "M（40~60名）", "L（60~80名）", "XL（80名~）")
+_STAMP_THRESH = (40, 60, 80)
+_STAMP_LABELS = ("~40", "40~60", "60~80", "80~")
+
 def calculate_guest_category(width, height):
     area = width * height
-    if area < 100000:
-        return "S（~40名）"
-    elif area < 180000:
-        return "M（40~60名）"
-    elif area < 280000:
-        return "L（60~80名）"
-    else:
-        return "XL（80名~）"
+    return _AREA_LABELS[bisect.bisect_right(_AREA_THRESH, area)]
 
+@lru_cache(maxsize=256)
 def calculate_recommended_guests(width_mm, height_mm):
     usable_area = (width_mm * height_mm) * 0.40
     stamp_area = 20 ** 2
     max_stamps = int(usable_area / stamp_area)
-    if max_stamps < 40:
-        return "~40", max_stamps
-    elif max_stamps < 60:
-        return "40~60", max_stamps
-    elif max_stamps < 80:
-        return "60~80", max_stamps
-    else:
-        return "80~", max_stamps
+    return _STAMP_LABELS[bisect.bisect_right(_STAMP_THRESH, max_stamps)], max_stamps
+
+# ターム名 → ID のプロセス内キャッシュ（語彙は小さく安定しているため常駐させる）
+_term_cache = {}
+
+
+def clear_term_cache():
+    """タームがWP側で編集された場合の手動クリア用"""
+    _term_cache.clear()
+
+
+def resolve_term_ids(taxonomy, names):
+    """複数タームのIDを一括解決する（不足分はbatchエンドポイントでまとめて作成）
+    Returns: {term_name: term_id}（解決できなかったタームは含まない）
+    """
+    # キャッシュ済みのタームはHTTPを介さず返す（解決成功分しかキャッシュしない）
+    ids = {n: _term_cache[(taxonomy, n)] for n in names if (taxonomy, n) in _term_cache}
+    names = [n for n in names if n not in ids]
+    if not names:
+        return ids
 
-def get_wc_term_id(term_name, taxonomy="categories"):
     endpoint = "products/categories" if taxonomy == "categories" else "products/tags"
     url = f"{get_wp_url()}/wp-json/wc/v3/{endpoint}"
     headers = _wp_auth_headers()
     try:
-        res = requests.get(url, headers=headers, params={"search": term_name, "per_page": 100}, timeout=15)
-        if res.status_code == 200:
-            for item in res.json():
-                if item["name"] == term_name:
-                    return item["id"]
-        # 存在しない場合は作成
-        create_res = requests.post(url, headers=headers, json={"name": term_name}, timeout=15)
-        if create_res.status_code == 201:
-            return create_res.json()["id"]
+        # POST先行: 新規作成と既存検出（term_exists + resource_id）を1往復で済ませる
+        create_res = _session.post(
+            f"{url}/batch",
+            data=_json_dumps_bytes({"create": [{"name": n} for n in names]}),
+            headers={**headers, 'Content-Type': 'application/json'}, timeout=15
+        )
+        if create_res.status_code in (200, 201):
+            created = _json_loads(create_res.content).get("create", [])
+            for name, item in zip(names, created):
+                if item.get("id"):
+                    ids[name] = item["id"]
+                else:
+                    error = item.get("error") or {}
+                    resource_id = (error.get("data") or {}).get("resource_id")
+                    if error.get("code") == "term_exists" and resource_id:
+                        ids[name] = resource_id
+        # 予期しない失敗分だけGETで走査（通常は通らない）
+        missing = [n for n in names if n not in ids]
+        if missing:
+            res = _session.get(url, headers=headers,
+                               params={"per_page": 100, "_fields": "id,name"}, timeout=15)
+            if res.status_code == 200:
+                existing = {item["name"]: item["id"] for item in _json_loads(res.content)}
+                ids.update({n: existing[n] for n in missing if n in existing})
     except Exception as e:
-        print(f"[WC Term] Error: {e}")
-    return None
+        print(f"[WC Term] Batch error: {e}")
+    for name, term_id in ids.items():
+        _term_cache[(taxonomy, name)] = term_id
+    return ids
+
+
+def get_wc_term_id(term_name, taxonomy="categories"):
+    return resolve_term_ids(taxonomy, [term_name]).get(term_name)
+
+
+def _prewarm_terms():
+    """既知語彙（樹種・樹木分類・サイズ区分）のタームIDを起動時に先読みする
+
+    読み取りのみでキャッシュを温める。WP側に無いタームは作成しない
+    （初回登録時にresolve_term_idsが作る）。
+    """
+    vocabulary = {
+        "categories": set(WOOD_INFO.keys()),
+        "tags": set(WOOD_INFO.keys()) | {"広葉樹", "針葉樹"} | set(_AREA_LABELS),
+    }
+    headers = _wp_auth_headers()
+    for taxonomy, names in vocabulary.items():
+        endpoint = "products/categories" if taxonomy == "categories" else "products/tags"
+        url = f"{get_wp_url()}/wp-json/wc/v3/{endpoint}"
+        try:
+            res = _session.get(url, headers=headers,
+                               params={"per_page": 100, "_fields": "id,name"}, timeout=15)
+            if res.status_code == 200:
+                for item in _json_loads(res.content):
+                    if item["name"] in names:
+                        _term_cache[(taxonomy, item["name"])] = item["id"]
+        except Exception as e:
+            print(f"[Product Register] Term prewarm failed ({taxonomy}): {e}")
+    print(f"[Product Register] Term cache prewarmed ({len(_term_cache)} terms)")
 
 def get_next_number(wood_type):
     """WordPress上の既存商品から次の番号を取得"""
@@ -118,43 +225,29 @@ def get_next_number(wood_type):
     headers = _wp_auth_headers()
     max_num = 0
     try:
-        res = requests.get(url, headers=headers, params={
-            "search": wood_type, "per_page": 100, "status": "any"
+        res = _session.get(url, headers=headers, params={
+            "search": wood_type, "per_page": 100, "status": "any",
+            "_fields": "name",  # 番号抽出に必要なのは商品名だけ
         }, timeout=15)
         if res.status_code == 200:
-            import re
-            for p in res.json():
-                match = re.search(r'No\.(\d+)', p.get('name', ''))
-                if match and wood_type in p.get('name', ''):
+            for p in _json_loads(res.content):
+                name = p.get('name', '')
+                if wood_type not in name:
+                    continue
+                match = _NO_RE.search(name)
+                if match:
                     max_num = max(max_num, int(match.group(1)))
     except Exception:
         pass
     return max_num + 1
 
-def generate_description(wood_type, width, height, number, thickness=20):
-    """商品説明HTMLを自動生成"""
-    wood_romaji = WOOD_ROMAJI.get(wood_type, "Natural Wood")
-    info = WOOD_INFO.get(wood_type, {})
-    meaning = info.get("meaning", "自然の恵み・温もり")
-    story = info.get("story", "")
-    recommend = info.get("recommend", "")
-    guests_text, _ = calculate_recommended_guests(width, height)
-
-    story_block = f'<p style="line-height:1.8;color:#444;">{story}</p>' if story else ""
-    recommend_block = ""
-    if recommend:
-        recommend_block = f"""
-<div style="background:#f0ede8;padding:20px;border-radius:8px;margin-top:20px;">
-    <p style="font-weight:600;margin-bottom:8px;color:#5D4E37;">&#128161; こんなおふたりに</p>
-    <p style="color:#555;line-height:1.7;margin:0;">{recommend}</p>
-</div>"""
-
-    return f"""
+# 商品説明テンプレート（値は内部の定数データのみなのでautoescapeは不要）
+_DESC_TMPL = Template("""
 <p style="text-align:center;margin-bottom:30px;">
     <span style="font-size:1.4em;letter-spacing:0.1em;font-weight:500;">「世界にひとつ」を選ぶ贅沢</span><br>
-    <span style="font-size:0.8em;color:#888;font-family:serif;">Authentic Wedding Board - {wood_romaji}</span>
+    <span style="font-size:0.8em;color:#888;font-family:serif;">Authentic Wedding Board - {{ wood_romaji }}</span>
 </p>
-{story_block}
+{{ story_block }}
 <p style="line-height:1.8;color:#444;">
     既製品にはない、自然が長い時間をかけて描いた木目と曲線。<br>
     誓いの言葉を記すそのキャンバスは、年を重ねるごとに味わいを増し、<br>
@@ -164,28 +257,90 @@ def generate_description(wood_type, width, height, number, thickness=20):
 <div style="background-color:#f9f9f9;padding:25px;border-radius:4px;">
     <p style="margin:0 0 10px 0;font-size:0.9em;color:#666;">Dataset</p>
     <table style="width:100%;border-collapse:collapse;font-size:0.95em;">
-        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;width:30%;">樹種</td><td style="padding:8px 0;border-bottom:1px solid #eee;"><strong>{wood_type} ({wood_romaji})</strong></td></tr>
-        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;">木言葉</td><td style="padding:8px 0;border-bottom:1px solid #eee;">{meaning}</td></tr>
-        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;">サイズ</td><td style="padding:8px 0;border-bottom:1px solid #eee;">W{width} × H{height} × D{thickness} mm</td></tr>
-        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;">推奨人数</td><td style="padding:8px 0;border-bottom:1px solid #eee;">約 {guests_text} 名様前後</td></tr>
-        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;">No.</td><td style="padding:8px 0;border-bottom:1px solid #eee;">{number}</td></tr>
+        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;width:30%;">樹種</td><td style="padding:8px 0;border-bottom:1px solid #eee;"><strong>{{ wood_type }} ({{ wood_romaji }})</strong></td></tr>
+        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;">木言葉</td><td style="padding:8px 0;border-bottom:1px solid #eee;">{{ meaning }}</td></tr>
+        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;">サイズ</td><td style="padding:8px 0;border-bottom:1px solid #eee;">W{{ width }} × H{{ height }} × D{{ thickness }} mm</td></tr>
+        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;">推奨人数</td><td style="padding:8px 0;border-bottom:1px solid #eee;">約 {{ guests_text }} 名様前後</td></tr>
+        <tr><td style="padding:8px 0;border-bottom:1px solid #eee;">No.</td><td style="padding:8px 0;border-bottom:1px solid #eee;">{{ number }}</td></tr>
     </table>
 </div>
-{recommend_block}
+{{ recommend_block }}
 <p style="font-size:0.85em;color:#888;margin-top:20px;text-align:right;">※ 表面は平滑にサンディング加工済みです。</p>
-"""
+""")
+
+
+def generate_description(wood_type, width, height, number, thickness=20,
+                         info=None, wood_romaji=None, guests_text=None):
+    """商品説明HTMLを自動生成（呼び出し側の計算済み値があれば再取得しない）"""
+    if info is None:
+        info = WOOD_INFO.get(wood_type, {})
+    if wood_romaji is None:
+        wood_romaji = WOOD_ROMAJI.get(wood_type, "Natural Wood")
+    if guests_text is None:
+        guests_text, _ = calculate_recommended_guests(width, height)
+    meaning = info.get("meaning", "自然の恵み・温もり")
+    story = info.get("story", "")
+    recommend = info.get("recommend", "")
+
+    story_block = f'<p style="line-height:1.8;color:#444;">{story}</p>' if story else ""
+    recommend_block = ""
+    if recommend:
+        recommend_block = f"""
+<div style="background:#f0ede8;padding:20px;border-radius:8px;margin-top:20px;">
+    <p style="font-weight:600;margin-bottom:8px;color:#5D4E37;">&#128161; こんなおふたりに</p>
+    <p style="color:#555;line-height:1.7;margin:0;">{recommend}</p>
+</div>"""
+
+    return _DESC_TMPL.render(
+        wood_type=wood_type, wood_romaji=wood_romaji, meaning=meaning,
+        width=width, height=height, thickness=thickness,
+        guests_text=guests_text, number=number,
+        story_block=story_block, recommend_block=recommend_block,
+    )
 
 def upload_media(image_data, filename):
-    """画像をWordPressメディアライブラリにアップロード"""
+    """画像をWordPressメディアライブラリにアップロード（bytesまたはfile-like）"""
     url = f"{get_wp_url()}/wp-json/wp/v2/media"
     headers = _wp_auth_headers()
     content_type = 'image/jpeg' if filename.lower().endswith(('.jpg', '.jpeg')) else 'image/png'
     files = {'file': (filename, image_data, content_type)}
-    res = requests.post(url, headers=headers, files=files, timeout=60)
+    res = _session.post(url, headers=headers, files=files, timeout=60)
     if res.status_code == 201:
-        return res.json()['id']
+        return _json_loads(res.content)['id']
     raise Exception(f"Media upload failed: {res.status_code} {res.text[:200]}")
 
+# アップロード前に縮小する長辺の上限（WP側でどのみち再エンコードされる）
+_MAX_IMAGE_EDGE = 2048
+
+
+def shrink_image(image_data, filename):
+    """長辺2048px超の画像を縮小JPEG化してアップロード量を減らす
+    Returns: (bytes, filename)（縮小不要・失敗時は元データを返す）
+    """
+    try:
+        img = Image.open(BytesIO(image_data))
+        # EXIFの回転を先にピクセルへ反映（スマホ縦写真対策・幅高も入れ替わる）
+        img = ImageOps.exif_transpose(img)
+        if max(img.size) <= _MAX_IMAGE_EDGE:
+            return image_data, filename
+        img.thumbnail((_MAX_IMAGE_EDGE, _MAX_IMAGE_EDGE), Image.Resampling.LANCZOS)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        buf = BytesIO()
+        img.save(buf, "JPEG", quality=85, optimize=True, progressive=True)
+        root, _ = os.path.splitext(filename)
+        return buf.getvalue(), root + ".jpg"
+    except Exception as e:
+        print(f"[Product Register] Image shrink skipped ({filename}): {e}")
+        return image_data, filename
+
+
+def _shrink_and_upload(filename, fileobj):
+    """縮小してからアップロード（ワーカースレッド上で実行される）"""
+    image_data, filename = shrink_image(fileobj.read(), filename)
+    return upload_media(image_data, filename)
+
+
 def create_product(wood_type, width, height, price, image_ids, number, thickness=20):
     """WooCommerce商品を作成"""
     url = f"{get_wp_url()}/wp-json/wc/v3/products"
@@ -197,26 +352,19 @@ def create_product(wood_type, width, height, price, image_ids, number, thickness
     guests_text, _ = calculate_recommended_guests(width, height)
 
     product_name = f"【一点物】 {wood_type} 一枚板 ({width}x{height}mm) No.{number:02d}"
-    description = generate_description(wood_type, width, height, f"{number:02d}", thickness)
+    description = generate_description(
+        wood_type, width, height, f"{number:02d}", thickness,
+        info=info, wood_romaji=wood_romaji, guests_text=guests_text,
+    )
     short_desc = f"【世界にひとつ】{wood_type}の一枚板ウェディングボード。木言葉は「{meaning}」。"
 
-    # カテゴリ・タグ
-    cat_ids = []
-    tag_ids = []
-    wc_id = get_wc_term_id(wood_type, "categories")
-    if wc_id:
-        cat_ids.append({"id": wc_id})
-    wt_id = get_wc_term_id(wood_type, "tags")
-    if wt_id:
-        tag_ids.append({"id": wt_id})
+    # カテゴリ・タグ（タクソノミーごとに一括解決）
     tree_type = info.get("type", "広葉樹")
-    tt_id = get_wc_term_id(tree_type, "tags")
-    if tt_id:
-        tag_ids.append({"id": tt_id})
     size_cat = calculate_guest_category(width, height)
-    sc_id = get_wc_term_id(size_cat, "tags")
-    if sc_id:
-        tag_ids.append({"id": sc_id})
+    cat_map = resolve_term_ids("categories", [wood_type])
+    tag_map = resolve_term_ids("tags", [wood_type, tree_type, size_cat])
+    cat_ids = [{"id": cat_map[wood_type]}] if wood_type in cat_map else []
+    tag_ids = [{"id": tag_map[n]} for n in (wood_type, tree_type, size_cat) if n in tag_map]
 
     product_data = {
         "name": product_name,
@@ -237,84 +385,162 @@ def create_product(wood_type, width, height, price, image_ids, number, thickness
         ]
     }
 
-    res = requests.post(url, headers=headers, json=product_data, timeout=60)
+    res = _session.post(
+        url, data=_json_dumps_bytes(product_data),
+        headers={**headers, 'Content-Type': 'application/json'}, timeout=60
+    )
     if res.status_code == 201:
-        data = res.json()
+        data = _json_loads(res.content)
         return {"id": data["id"], "name": data["name"], "permalink": data["permalink"]}
     raise Exception(f"Product creation failed: {res.status_code} {res.text[:300]}")
 
 
-# ===== Flask ルート登録 =====
+# ===== Quart ルート登録 =====
+# 登録ジョブの状態（job_id → {state, message, product_url, product_id}）
+_register_jobs = {}
+_REGISTER_JOBS_MAX = 100
+
+
+async def _run_register_job(job_id, wood_type, width, height, thickness, price, uploads):
+    """登録処理本体（バックグラウンドタスクとして実行・結果は_register_jobsへ）"""
+    job = _register_jobs[job_id]
+    try:
+        # アップロード・次番号取得・ターム解決は独立なのでまとめて並行実行
+        # （ターム解決はキャッシュを温めるだけで、結果はcreate_productが拾う）
+        tree_type = WOOD_INFO.get(wood_type, {}).get("type", "広葉樹")
+        size_cat = calculate_guest_category(width, height)
+        number, _, _, *image_ids = await asyncio.gather(
+            asyncio.to_thread(get_next_number, wood_type),
+            asyncio.to_thread(resolve_term_ids, "categories", [wood_type]),
+            asyncio.to_thread(resolve_term_ids, "tags", [wood_type, tree_type, size_cat]),
+            *(asyncio.to_thread(_shrink_and_upload, fname, BytesIO(img_data))
+              for _, fname, img_data in uploads),
+        )
+        for (label, _, _), media_id in zip(uploads, image_ids):
+            print(f"[Product Register] Image {label} uploaded (ID: {media_id})")
+
+        # 商品作成
+        result = await asyncio.to_thread(
+            create_product, wood_type, width, height, price, image_ids, number, thickness
+        )
+        print(f"[Product Register] Created: {result['name']} (ID: {result['id']})")
+        job.update(
+            state="done",
+            message=f"{result['name']} を登録しました",
+            product_url=result['permalink'],
+            product_id=result['id'],
+        )
+    except Exception as e:
+        print(f"[Product Register] Error: {e}")
+        job.update(state="error", message=str(e))
+
+
+# レンダリング済みページのキャッシュ（テンプレート変数は起動後固定）
+_page_cache = {}
+
+
+def _authed():
+    """商品登録ページの認証チェック（is比較で素通し判定を確実にする）"""
+    return session.get('pr_auth') is True
+
+
 def register_routes(app):
-    """Flask appにルートを登録する"""
+    """Quart appにルートを登録する"""
+
+    # 既知語彙のタームIDをバックグラウンドで先読み（起動はブロックしない）
+    if get_wp_user() and get_wp_password():
+        threading.Thread(target=_prewarm_terms, daemon=True).start()
 
     @app.route('/product-register', methods=['GET'])
-    def product_register_page():
+    async def product_register_page():
         # パスワード認証チェック
-        if session.get('pr_auth') != True:
-            return render_template_string(LOGIN_HTML)
-        return render_template_string(REGISTER_HTML, wood_types=sorted(WOOD_INFO.keys()))
+        if not _authed():
+            if 'login' not in _page_cache:
+                _page_cache['login'] = await render_template_string(LOGIN_HTML)
+            return _page_cache['login']
+        if 'register' not in _page_cache:
+            _page_cache['register'] = await render_template_string(
+                REGISTER_HTML, wood_types=_WOOD_TYPES_SORTED
+            )
+        return _page_cache['register']
 
     @app.route('/product-register/login', methods=['POST'])
-    def product_register_login():
-        password = request.form.get('password', '')
+    async def product_register_login():
+        form = await request.form
+        password = form.get('password', '')
         if password == get_register_password():
             session['pr_auth'] = True
             return redirect('/product-register')
-        return render_template_string(LOGIN_HTML, error="パスワードが違います")
+        return await render_template_string(LOGIN_HTML, error="パスワードが違います")
 
     @app.route('/product-register/api/register', methods=['POST'])
-    def product_register_api():
-        if session.get('pr_auth') != True:
+    async def product_register_api():
+        if not _authed():
             return jsonify({"success": False, "message": "認証が必要です"}), 401
 
         try:
-            wood_type = request.form.get('wood_type')
-            width = int(request.form.get('width', 0))
-            height = int(request.form.get('height', 0))
-            thickness = int(request.form.get('thickness', 20))
-            price_grade = request.form.get('price_grade', 'A')
+            form = await request.form
+            files = await request.files
+            wood_type = form.get('wood_type')
+            width = int(form.get('width', 0))
+            height = int(form.get('height', 0))
+            thickness = int(form.get('thickness', 20))
+            price_grade = form.get('price_grade', 'A')
             price = PRICE_MAP.get(price_grade, 30000)
 
             if not wood_type or width <= 0 or height <= 0:
                 return jsonify({"success": False, "message": "樹種・サイズを入力してください"})
 
-            # 画像アップロード
-            image_ids = []
+            # 画像はリクエスト終了後もジョブが使うためここでbytesに読む
             labels = ['塗装あり表', '塗装あり裏', '無塗装表', '無塗装裏']
+            uploads = []
             for i in range(1, 5):
-                file = request.files.get(f'image_{i}')
+                file = files.get(f'image_{i}')
                 if file and file.filename:
                     fname = f"{wood_type}_{i}_{file.filename}"
-                    img_data = file.read()
-                    media_id = upload_media(img_data, fname)
-                    image_ids.append(media_id)
-                    print(f"[Product Register] Image {labels[i-1]} uploaded (ID: {media_id})")
+                    file.stream.seek(0)
+                    uploads.append((labels[i - 1], fname, file.read()))
 
-            if not image_ids:
+            if not uploads:
                 return jsonify({"success": False, "message": "画像を1枚以上アップロードしてください"})
 
-            # 次の番号を取得
-            number = get_next_number(wood_type)
-
-            # 商品作成
-            result = create_product(wood_type, width, height, price, image_ids, number, thickness)
-            print(f"[Product Register] Created: {result['name']} (ID: {result['id']})")
+            # 完了済みジョブを間引いてから新規ジョブを登録
+            if len(_register_jobs) > _REGISTER_JOBS_MAX:
+                done = [k for k, v in _register_jobs.items() if v["state"] != "processing"]
+                for k in done[:len(_register_jobs) - _REGISTER_JOBS_MAX]:
+                    _register_jobs.pop(k, None)
 
-            return jsonify({
-                "success": True,
-                "message": f"{result['name']} を登録しました",
-                "product_url": result['permalink'],
-                "product_id": result['id']
-            })
+            job_id = uuid.uuid4().hex
+            _register_jobs[job_id] = {
+                "state": "processing", "message": "", "product_url": None, "product_id": None,
+            }
+            # ブラウザを待たせずバックグラウンドで登録（フロントはstatusをポーリング）
+            _register_jobs[job_id]["task"] = asyncio.create_task(
+                _run_register_job(job_id, wood_type, width, height, thickness, price, uploads)
+            )
+            return jsonify({"success": True, "job_id": job_id, "state": "processing"})
 
         except Exception as e:
             print(f"[Product Register] Error: {e}")
             return jsonify({"success": False, "message": str(e)})
 
+    @app.route('/product-register/api/status/<job_id>', methods=['GET'])
+    async def product_register_status(job_id):
+        if not _authed():
+            return jsonify({"state": "unknown"}), 401
+        job = _register_jobs.get(job_id)
+        if not job:
+            return jsonify({"state": "unknown", "message": "ジョブが見つかりません"}), 404
+        return jsonify({
+            "state": job["state"],
+            "message": job["message"],
+            "product_url": job["product_url"],
+            "product_id": job["product_id"],
+        })
+
     @app.route('/product-register/api/wood-info', methods=['GET'])
-    def product_register_wood_info():
-        if session.get('pr_auth') != True:
+    async def product_register_wood_info():
+        if not _authed():
             return jsonify({}), 401
         wood = request.args.get('wood', '')
         info = WOOD_INFO.get(wood, {})
@@ -579,12 +805,7 @@ document.getElementById('registerForm').addEventListener('submit', function(e) {
     loading.classList.add('show');
     result.style.display = 'none';
 
-    fetch('/product-register/api/register', {
-        method: 'POST',
-        body: formData
-    })
-    .then(r => r.json())
-    .then(data => {
+    function showResult(data) {
         loading.classList.remove('show');
         btn.disabled = false;
         result.style.display = 'block';
@@ -606,14 +827,38 @@ document.getElementById('registerForm').addEventListener('submit', function(e) {
             result.className = 'result error';
             result.textContent = 'エラー: ' + data.message;
         }
+    }
+
+    function pollStatus(jobId) {
+        fetch('/product-register/api/status/' + jobId)
+        .then(r => r.json())
+        .then(data => {
+            if (data.state === 'processing') {
+                setTimeout(() => pollStatus(jobId), 2000);
+                return;
+            }
+            showResult({
+                success: data.state === 'done',
+                message: data.message,
+                product_url: data.product_url
+            });
+        })
+        .catch(err => showResult({success: false, message: '通信エラー: ' + err.message}));
+    }
+
+    fetch('/product-register/api/register', {
+        method: 'POST',
+        body: formData
+    })
+    .then(r => r.json())
+    .then(data => {
+        if (data.success && data.job_id) {
+            pollStatus(data.job_id);
+        } else {
+            showResult(data);
+        }
     })
-    .catch(err => {
-        loading.classList.remove('show');
-        btn.disabled = false;
-        result.style.display = 'block';
-        result.className = 'result error';
-        result.textContent = '通信エラー: ' + err.message;
-    });
+    .catch(err => showResult({success: false, message: '通信エラー: ' + err.message}));
 });
 </script>
 </body>